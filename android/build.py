@@ -2,17 +2,33 @@
 
 import os, os.path
 import shutil
-import sys, subprocess
+import sys
 
 if len(sys.argv) < 4:
-    print("Usage: build.py SDK_PATH NDK_PATH ABI [configure_args...]", file=sys.stderr)
+    print("Usage: build.py SDK_PATH NDK_PATH ABI[,ABI...]|all [--sources-only] [--ninja] [--profile=NAME] [configure_args...]", file=sys.stderr)
     sys.exit(1)
 
 sdk_path = sys.argv[1]
 ndk_path = sys.argv[2]
-android_abi = sys.argv[3]
+abi_arg = sys.argv[3]
 configure_args = sys.argv[4:]
 
+sources_only = False
+use_ninja = False
+profile = None
+while configure_args and (configure_args[0] in ('--sources-only', '--ninja') or
+                          configure_args[0].startswith('--profile=')):
+    arg = configure_args.pop(0)
+    if arg == '--sources-only':
+        # only download and unpack; see python/build-matrix.py
+        sources_only = True
+    elif arg == '--ninja':
+        # build the third-party libraries with a generated build.ninja
+        use_ninja = True
+    else:
+        # compiler settings, see python/build/profiles.py
+        profile = arg.split('=', 1)[1]
+
 if not os.path.isfile(os.path.join(sdk_path, 'licenses', 'android-sdk-license')):
     print("SDK not found in", sdk_path, file=sys.stderr)
     sys.exit(1)
@@ -27,49 +43,130 @@ sys.path[0] = os.path.join(mpd_path, 'python')
 
 # output directories
 from build.dirs import lib_path, tarball_path, src_path
-from build.toolchain import AndroidNdkToolchain
+from build.toolchain import get_android_toolchain, android_abis
+
+if abi_arg == 'all':
+    abis = list(android_abis)
+else:
+    abis = abi_arg.split(',')
+
+for android_abi in abis:
+    if android_abi not in android_abis:
+        print("Unknown ABI:", android_abi, file=sys.stderr)
+        sys.exit(1)
 
 # a list of third-party libraries to be used by MPD on Android
-from build.libs import *
-thirdparty_libs = [
-    libmodplug,
-    wildmidi,
-    gme,
-    ffmpeg,
-    libnfs,
-]
-
-# build the third-party libraries
-for x in thirdparty_libs:
-    toolchain = AndroidNdkToolchain(mpd_path, lib_path,
-                                    tarball_path, src_path,
-                                    ndk_path, android_abi,
-                                    use_cxx=x.use_cxx)
-    if not x.is_installed(toolchain):
-        x.build(toolchain)
+from build import libs
+thirdparty_names = (
+    'libmodplug',
+    'wildmidi',
+    'gme',
+    'ffmpeg',
+    'libnfs',
+)
+thirdparty_libs = [libs.get(name) for name in thirdparty_names]
 
-# configure and build MPD
-toolchain = AndroidNdkToolchain(mpd_path, lib_path,
-                                tarball_path, src_path,
-                                ndk_path, android_abi,
-                                use_cxx=True)
-
-configure_args += [
-    '-Dandroid_sdk=' + sdk_path,
-    '-Dandroid_ndk=' + ndk_path,
-    '-Dandroid_abi=' + android_abi,
-    '-Dandroid_strip=' + toolchain.strip,
-    '-Dopenssl:asm=disabled',
-    '-Dwrap_mode=forcefallback'
-]
+# if nothing has changed since the last build, skip the whole
+# dependency stage (this only needs stat() calls)
+from build import uptodate
+nodes = [(x, get_android_toolchain(mpd_path, lib_path,
+                                   tarball_path, src_path,
+                                   ndk_path, android_abi,
+                                   use_cxx=x.use_cxx, profile=profile))
+         for android_abi in abis for x in thirdparty_libs]
+up_to_date = not sources_only and uptodate.is_up_to_date(nodes)
+
+# download and verify all tarballs in parallel and only once; they
+# are shared by all ABIs (and so are the source trees, which are
+# unpacked only once)
+from build.download import download_all
+from build import trace
+
+# write the build reports even if the build fails; a failed or slow
+# build is when they are needed most
+import atexit
+atexit.register(trace.write_reports, lib_path)
+if not up_to_date and not use_ninja:
+    with trace.span('download'):
+        download_all([(x.url, x.md5) for x in thirdparty_libs], tarball_path)
+
+if sources_only:
+    for x in thirdparty_libs:
+        x.prepare(get_android_toolchain(mpd_path, lib_path,
+                                        tarball_path, src_path,
+                                        ndk_path, abis[0],
+                                        use_cxx=x.use_cxx, profile=profile))
+    sys.exit(0)
+
+# build the third-party libraries for all ABIs concurrently; all make
+# and ninja processes share one jobserver
+from build import jobserver
+from build.jobs import get_default_jobs
+jobserver.start(get_default_jobs())
 
+if not up_to_date:
+    if use_ninja:
+        from build import ninjafile, targets
+        ninjafile.run(os.path.join(lib_path, 'ninja'),
+                      [(name, targets.android(mpd_path, lib_path,
+                                              tarball_path, src_path,
+                                              ndk_path, android_abi,
+                                              libs.get(name).use_cxx, profile))
+                       for android_abi in abis for name in thirdparty_names])
+    else:
+        from build.scheduler import Scheduler
+        scheduler = Scheduler()
+        for x, toolchain in nodes:
+            scheduler.add(x, toolchain)
+        scheduler.run()
+    uptodate.mark_up_to_date(nodes)
+
+# configure and build MPD
 from build.meson import configure as run_meson
-run_meson(toolchain, mpd_path, '.', configure_args)
+from build import ccache, jobs
 
 ninja = shutil.which("ninja")
-subprocess.check_call([ninja], env=toolchain.env)
 
-subprocess.check_call([ninja, 'install'], env=toolchain.env)
+def build_mpd(android_abi: str, build_dir: str, ninja_args: list[str]=[]) -> None:
+    toolchain = get_android_toolchain(mpd_path, lib_path,
+                                      tarball_path, src_path,
+                                      ndk_path, android_abi,
+                                      use_cxx=True, profile=profile)
+    js = jobserver.get()
+    if js is not None:
+        js.apply(toolchain.env)
+
+    with trace.span('build', project='mpd-' + android_abi):
+        run_meson(toolchain, mpd_path, build_dir, configure_args + [
+            '-Dandroid_sdk=' + sdk_path,
+            '-Dandroid_ndk=' + ndk_path,
+            '-Dandroid_abi=' + android_abi,
+            '-Dandroid_strip=' + toolchain.strip,
+            '-Dopenssl:asm=disabled',
+            '-Dwrap_mode=forcefallback'
+        ])
+
+        with trace.span('compile'):
+            trace.check_call([ninja] + ninja_args, cwd=build_dir, env=toolchain.env)
+
+        with trace.span('install'):
+            trace.check_call([ninja, 'install'], cwd=build_dir, env=toolchain.env)
+
+if len(abis) == 1:
+    build_mpd(abis[0], '.')
+    flavor = abis[0].capitalize()
+else:
+    # one MPD build directory per ABI, sharing the job limit
+    from concurrent.futures import ThreadPoolExecutor
+    with jobs.limit(max(1, get_default_jobs() // len(abis))):
+        ninja_args = jobs.get_ninja_jobs_args()
+    with ThreadPoolExecutor(max_workers=len(abis)) as executor:
+        for future in [executor.submit(build_mpd, android_abi, android_abi, ninja_args)
+                       for android_abi in abis]:
+            future.result()
+    flavor = 'Universal'
+
+ccache.print_summary()
 
 print("""
 -------------------------------------
@@ -79,4 +176,4 @@ print("""
 ## or, for a universal apk (includes both arm64-v8a and x86_64)
 # ./gradlew assembleUniversalDebug
 -------------------------------------
-""".format(android_abi.capitalize()))
\ No newline at end of file
+""".format(flavor))
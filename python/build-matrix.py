@@ -0,0 +1,156 @@
+#!/usr/bin/env -S python3 -u
+
+# Build MPD for several targets at once, e.g.:
+#
+#  mkdir -p output/nightly
+#  cd output/nightly
+#  ../../python/build-matrix.py --android-sdk=SDK_PATH --android-ndk=NDK_PATH \
+#    win32:x64 win32:x86 android:all -- \
+#    --buildtype=debugoptimized -Db_ndebug=true -Dwrap_mode=forcefallback
+#
+# Each target is built by a worker process (win32/build.py or
+# android/build.py) in its own subdirectory.  All workers share the
+# downloaded and unpacked sources (MPD_SHARED_LIB), which are prepared
+# once before the workers start, and one jobserver.
+
+import os, os.path
+import subprocess
+import sys
+import threading
+import time
+from typing import IO, Optional
+
+# the path to the MPD sources
+mpd_path = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]) or '.', '..'))
+sys.path[0] = os.path.join(mpd_path, 'python')
+
+from build.jobs import get_default_jobs
+from build.toolchain import android_abis
+from build import jobserver
+
+WIN32_ARCHS = {'x64': '--64', 'x86': '--32'}
+
+class Target:
+    def __init__(self, name: str, platform: str, args: list[str]):
+        self.name = name
+        self.platform = platform
+        self.args = args
+        self.status: Optional[int] = None
+        self.duration = 0.0
+
+def usage() -> None:
+    print("Usage: build-matrix.py [--android-sdk=PATH] [--android-ndk=PATH]"
+          " TARGET... [-- configure_args...]", file=sys.stderr)
+    print("Targets: " + ', '.join(['win32:' + a for a in WIN32_ARCHS] +
+                                  ['android:' + a for a in android_abis] +
+                                  ['android:all']), file=sys.stderr)
+    sys.exit(1)
+
+def get_script(platform: str) -> str:
+    return os.path.join(mpd_path, platform, 'build.py')
+
+def parse_target(spec: str, sdk_path: Optional[str], ndk_path: Optional[str]) -> list[Target]:
+    platform, _, arch = spec.partition(':')
+    if platform == 'win32' and arch in WIN32_ARCHS:
+        return [Target(f'win32-{arch}', platform, [WIN32_ARCHS[arch]])]
+    elif platform == 'android' and (arch in android_abis or arch == 'all'):
+        if sdk_path is None or ndk_path is None:
+            print("Android targets need --android-sdk and --android-ndk", file=sys.stderr)
+            sys.exit(1)
+        abis = list(android_abis) if arch == 'all' else [arch]
+        return [Target(f'android-{abi}', platform, [sdk_path, ndk_path, abi])
+                for abi in abis]
+    else:
+        print("Unknown target:", spec, file=sys.stderr)
+        usage()
+        return []
+
+def stream(target: Target, pipe: IO[str], log: IO[str], lock: threading.Lock) -> None:
+    for line in pipe:
+        log.write(line)
+        with lock:
+            sys.stdout.write(f'[{target.name}] {line}')
+
+def run_worker(target: Target, configure_args: list[str],
+               env: dict[str, str], lock: threading.Lock) -> None:
+    path = os.path.abspath(target.name)
+    os.makedirs(path, exist_ok=True)
+
+    start = time.monotonic()
+    with open(os.path.join(path, 'build.log'), 'w') as log, \
+         subprocess.Popen([sys.executable, '-u', get_script(target.platform)] +
+                          target.args + configure_args,
+                          cwd=path, env=env, text=True,
+                          stdin=subprocess.DEVNULL,
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT) as p:
+        assert(p.stdout is not None)
+        stream(target, p.stdout, log, lock)
+    target.status = p.returncode
+    target.duration = time.monotonic() - start
+
+args = sys.argv[1:]
+configure_args: list[str] = []
+if '--' in args:
+    i = args.index('--')
+    args, configure_args = args[:i], args[i + 1:]
+
+sdk_path: Optional[str] = None
+ndk_path: Optional[str] = None
+specs = []
+for arg in args:
+    if arg.startswith('--android-sdk='):
+        sdk_path = os.path.abspath(arg.split('=', 1)[1])
+    elif arg.startswith('--android-ndk='):
+        ndk_path = os.path.abspath(arg.split('=', 1)[1])
+    elif arg.startswith('-'):
+        usage()
+    else:
+        specs.append(arg)
+
+if not specs:
+    usage()
+
+targets = [t for spec in specs for t in parse_target(spec, sdk_path, ndk_path)]
+
+env = dict(os.environ)
+
+# all workers share downloads, source trees and caches
+env.setdefault('MPD_SHARED_LIB', os.path.abspath('lib'))
+
+# all make and ninja processes of all workers share one jobserver; if
+# there is none, split the job limit among the workers
+js = jobserver.start(get_default_jobs())
+if js is not None:
+    js.apply(env)
+else:
+    env.setdefault('MPD_BUILD_JOBS', str(max(1, get_default_jobs() // len(targets))))
+
+start = time.monotonic()
+lock = threading.Lock()
+
+# prepare the sources once, not once per worker
+for platform in sorted(set(t.platform for t in targets)):
+    first = next(t for t in targets if t.platform == platform)
+    os.makedirs(first.name, exist_ok=True)
+    print(f"preparing sources for {platform}")
+    if subprocess.call([sys.executable, '-u', get_script(platform)] +
+                       first.args + ['--sources-only'],
+                       cwd=first.name, env=env) != 0:
+        print(f"failed to prepare sources for {platform}", file=sys.stderr)
+        sys.exit(1)
+
+threads = [threading.Thread(target=run_worker, args=(t, configure_args, env, lock))
+           for t in targets]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+
+print()
+print(f"{'target':<24} {'status':<8} {'time':>8}")
+for target in targets:
+    status = 'ok' if target.status == 0 else f'failed ({target.status})'
+    print(f"{target.name:<24} {status:<8} {target.duration:7.1f}s")
+print(f"total: {time.monotonic() - start:.1f}s")
+
+sys.exit(0 if all(t.status == 0 for t in targets) else 1)
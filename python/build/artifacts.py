@@ -0,0 +1,119 @@
+import io
+import os
+import tarfile
+import time
+from typing import Optional
+
+from .dirs import cache_path
+
+# the placeholder for the install prefix in text files (e.g. pkg-config
+# and libtool files) stored in the artifact cache; this allows
+# restoring an artifact into a different prefix
+PREFIX_PLACEHOLDER = b'@MPD_INSTALL_PREFIX@'
+
+def get_artifact_path() -> Optional[str]:
+    """Return the directory of the artifact cache, or None if it is
+    disabled.  It defaults to a subdirectory of the build cache and
+    can be changed (e.g. to a shared file system) with the environment
+    variable MPD_ARTIFACT_CACHE; an empty value disables it."""
+
+    path = os.environ.get('MPD_ARTIFACT_CACHE')
+    if path is None:
+        return os.path.join(cache_path, 'artifacts')
+    if path == '':
+        return None
+    return path
+
+def __is_text(data: bytes) -> bool:
+    return b'\0' not in data
+
+def __get_artifact_file(key: str) -> Optional[str]:
+    artifact_path = get_artifact_path()
+    if artifact_path is None:
+        return None
+    return os.path.join(artifact_path, key[:2], key + '.tar.gz')
+
+def store(key: str, install_prefix: str, files: list[str]) -> None:
+    """Pack the given files (relative to the install prefix) into the
+    artifact cache."""
+
+    path = __get_artifact_file(key)
+    if path is None:
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    prefix = os.fsencode(install_prefix)
+
+    # write to a temporary file first, so concurrent readers (possibly
+    # on other machines) never see a partial artifact
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with tarfile.open(tmp_path, 'w:gz') as tar:
+        for name in sorted(files):
+            full = os.path.join(install_prefix, name)
+            info = tar.gettarinfo(full, arcname=name)
+            if not info.isfile():
+                tar.addfile(info)
+                continue
+
+            with open(full, 'rb') as f:
+                data = f.read()
+            if __is_text(data):
+                data = data.replace(prefix, PREFIX_PLACEHOLDER)
+            info.size = len(data)
+
+            tar.addfile(info, io.BytesIO(data))
+    os.replace(tmp_path, path)
+
+def restore(key: str, install_prefix: str) -> Optional[list[str]]:
+    """Unpack an artifact into the install prefix.  Returns the list of
+    files (relative to the install prefix), or None if the artifact
+    cache does not contain the given key."""
+
+    path = __get_artifact_file(key)
+    if path is None:
+        return None
+
+    try:
+        tar = tarfile.open(path, 'r:gz')
+    except FileNotFoundError:
+        return None
+
+    prefix = os.fsencode(install_prefix)
+    now = time.time()
+    files = []
+
+    with tar:
+        for info in tar:
+            name = os.path.normpath(info.name)
+            if os.path.isabs(name) or name.startswith('..'):
+                raise RuntimeError('Malformed artifact: ' + path)
+
+            full = os.path.join(install_prefix, name)
+            if info.isdir():
+                os.makedirs(full, exist_ok=True)
+                continue
+
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            try:
+                os.unlink(full)
+            except FileNotFoundError:
+                pass
+
+            if info.issym():
+                os.symlink(info.linkname, full)
+            elif info.isfile():
+                f = tar.extractfile(info)
+                assert(f is not None)
+                data = f.read()
+                if __is_text(data):
+                    data = data.replace(PREFIX_PLACEHOLDER, prefix)
+                with open(full, 'wb') as out:
+                    out.write(data)
+                os.chmod(full, info.mode)
+                os.utime(full, (now, now))
+            else:
+                continue
+
+            files.append(name)
+
+    return files
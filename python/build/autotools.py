@@ -3,8 +3,13 @@ from typing import Collection, Iterable, Optional, Sequence, Union
 from collections.abc import Mapping
 
 from build.makeproject import MakeProject
+from . import bootstrapcache, configcache, trace
+from .lock import file_lock
 from .toolchain import AnyToolchain
 
+# source trees which have already been bootstrapped by this process
+_bootstrapped: set[str] = set()
+
 class AutotoolsProject(MakeProject):
     def __init__(self, url: Union[str, Sequence[str]], md5: str, installed: str,
                  configure_args: Iterable[str]=[],
@@ -26,27 +31,62 @@ class AutotoolsProject(MakeProject):
         self.libs = libs
         self.subdirs = subdirs
 
-    def configure(self, toolchain: AnyToolchain) -> str:
-        src = self.unpack(toolchain)
+    def get_arch_cflags(self, toolchain: AnyToolchain) -> str:
+        if self.per_arch_cflags is not None and toolchain.host_triplet is not None:
+            return self.per_arch_cflags.get(toolchain.host_triplet, '')
+        return ''
+
+    def get_fingerprint_inputs(self, toolchain: AnyToolchain) -> list[str]:
+        return MakeProject.get_fingerprint_inputs(self, toolchain) + [
+            f'configure_args={list(self.configure_args)!r}',
+            f'autogen={self.autogen}',
+            f'autoreconf={self.autoreconf}',
+            'arch_cflags=' + self.get_arch_cflags(toolchain),
+            'cppflags=' + self.cppflags,
+            'ldflags=' + self.ldflags,
+            'libs=' + self.libs,
+            f'subdirs={self.subdirs!r}',
+        ]
+
+    def bootstrap(self, src: str) -> None:
         if self.autogen:
             if sys.platform == 'darwin':
-                subprocess.check_call(['glibtoolize', '--force'], cwd=src)
+                trace.check_call(['glibtoolize', '--force'], cwd=src)
             else:
-                subprocess.check_call(['libtoolize', '--force'], cwd=src)
-            subprocess.check_call(['aclocal'], cwd=src)
-            subprocess.check_call(['automake', '--add-missing', '--force-missing', '--foreign'], cwd=src)
-            subprocess.check_call(['autoconf'], cwd=src)
+                trace.check_call(['libtoolize', '--force'], cwd=src)
+            trace.check_call(['aclocal'], cwd=src)
+            trace.check_call(['automake', '--add-missing', '--force-missing', '--foreign'], cwd=src)
+            trace.check_call(['autoconf'], cwd=src)
         if self.autoreconf:
-            subprocess.check_call(['autoreconf', '-vif'], cwd=src)
+            trace.check_call(['autoreconf', '-vif'], cwd=src)
+
+    def configure(self, toolchain: AnyToolchain) -> str:
+        src = self.unpack(toolchain)
+        if self.autogen or self.autoreconf:
+            # the source tree may be shared with concurrent builds
+            with file_lock(src + '.lock'):
+                if src not in _bootstrapped:
+                    key = bootstrapcache.get_key([
+                        self.get_source_key(),
+                        f'autogen={self.autogen}',
+                        f'autoreconf={self.autoreconf}',
+                        sys.platform,
+                    ])
+                    with trace.span('autoreconf'):
+                        bootstrapcache.bootstrap(key, src,
+                                                 lambda: self.bootstrap(src))
+                    _bootstrapped.add(src)
+
+        build = self.get_configured_build_path(toolchain)
+        if build is not None:
+            # the generated Makefiles re-run config.status if needed
+            return build
 
         build = self.make_build_path(toolchain)
 
-        arch_cflags = ''
-        if self.per_arch_cflags is not None and toolchain.host_triplet is not None:
-            arch_cflags = self.per_arch_cflags.get(toolchain.host_triplet, '')
+        arch_cflags = self.get_arch_cflags(toolchain)
 
-        configure = [
-            os.path.join(src, 'configure'),
+        variables = [
             'CC=' + toolchain.cc,
             'CXX=' + toolchain.cxx,
             'CFLAGS=' + toolchain.cflags + ' ' + arch_cflags,
@@ -58,6 +98,17 @@ class AutotoolsProject(MakeProject):
             'ARFLAGS=' + toolchain.arflags,
             'RANLIB=' + toolchain.ranlib,
             'STRIP=' + toolchain.strip,
+        ]
+
+        # all configure runs with the same toolchain and flags share
+        # the results of compiler feature checks
+        shared_cache_file = configcache.get_cache_file(toolchain.host_triplet,
+                                                       variables)
+        cache_file = os.path.join(build, 'config.cache')
+        configcache.load(shared_cache_file, cache_file)
+
+        configure = [os.path.join(src, 'configure')] + variables + [
+            '--cache-file=' + cache_file,
             '--prefix=' + toolchain.install_prefix,
             '--disable-silent-rules',
         ]
@@ -66,10 +117,12 @@ class AutotoolsProject(MakeProject):
             configure.append('--host=' + toolchain.host_triplet)
 
         configure.extend(self.configure_args)
+        configure.extend(self.get_profile_args(toolchain))
 
         try:
             print(configure)
-            subprocess.check_call(configure, cwd=build, env=toolchain.env)
+            with trace.span('configure'):
+                trace.check_call(configure, cwd=build, env=toolchain.env)
         except subprocess.CalledProcessError:
             # dump config.log after a failed configure run
             try:
@@ -80,12 +133,19 @@ class AutotoolsProject(MakeProject):
             # re-raise the exception
             raise
 
+        configcache.merge(shared_cache_file, cache_file)
+        self.mark_configured(toolchain, build)
         return build
 
-    def _build(self, toolchain: AnyToolchain) -> None:
-        build = self.configure(toolchain)
-        if self.subdirs is not None:
-            for subdir in self.subdirs:
-                self.build_make(toolchain, os.path.join(build, subdir))
-        else:
-            self.build_make(toolchain, build)
+    def __get_make_dirs(self, build: str) -> list[str]:
+        if self.subdirs is None:
+            return [build]
+        return [os.path.join(build, subdir) for subdir in self.subdirs]
+
+    def compile(self, toolchain: AnyToolchain, build: str) -> None:
+        for wd in self.__get_make_dirs(build):
+            MakeProject.compile(self, toolchain, wd)
+
+    def install(self, toolchain: AnyToolchain, build: str, destdir: str) -> None:
+        for wd in self.__get_make_dirs(build):
+            MakeProject.install(self, toolchain, wd, destdir)
@@ -0,0 +1,151 @@
+import functools
+import hashlib
+import os
+import subprocess
+import tarfile
+import time
+from typing import Any, Callable, Iterable, Optional
+
+from .dirs import cache_path
+from .fsutil import scan_tree
+from .lock import file_lock
+
+# the programs whose versions determine the generated files
+AUTOTOOLS = ('autoconf', 'automake', 'aclocal', 'libtoolize', 'glibtoolize',
+             'autopoint', 'm4')
+
+# a file inside bootstrapped source trees containing the cache key
+STAMP_FILE = '.mpd-bootstrap-key'
+
+# a file inside bootstrapped source trees listing the generated files
+FILES_FILE = '.mpd-bootstrap-files'
+
+# scratch files created by autoconf which are not needed afterwards
+EXCLUDE_DIRS = ('autom4te.cache',)
+
+@functools.cache
+def __get_tool_version(program: str) -> str:
+    try:
+        output = subprocess.check_output([program, '--version'], text=True,
+                                         stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+    return output.split('\n', 1)[0]
+
+def get_key(inputs: Iterable[str]) -> str:
+    """Calculate a cache key from the given inputs (the source key and
+    the bootstrap options) plus the versions of all autotools
+    programs."""
+
+    h = hashlib.sha256()
+    for x in list(inputs) + [__get_tool_version(p) for p in AUTOTOOLS]:
+        h.update(x.encode() + b'\0')
+    return h.hexdigest()
+
+def __is_excluded(name: str) -> bool:
+    return name.split(os.sep, 1)[0] in EXCLUDE_DIRS or \
+        name in (STAMP_FILE, FILES_FILE)
+
+def __remove_generated(src: str) -> bool:
+    """Delete the files generated by an earlier bootstrap of this tree
+    (with a different key), so a new bootstrap generates all of them
+    again.  Returns False if they are unknown."""
+
+    try:
+        with open(os.path.join(src, FILES_FILE)) as f:
+            files = f.read().splitlines()
+    except FileNotFoundError:
+        return False
+
+    for name in files:
+        try:
+            os.unlink(os.path.join(src, name))
+        except FileNotFoundError:
+            pass
+    return True
+
+def __restore(path: str, src: str) -> Optional[list[str]]:
+    """Extract the generated files from the cache and return their
+    names, or None if there is no cache entry."""
+
+    try:
+        tar = tarfile.open(path, 'r:')
+    except FileNotFoundError:
+        return None
+
+    # all generated files get the same (current) time stamp, which is
+    # newer than all sources; this way, make will not attempt to
+    # regenerate them
+    now = time.time()
+    kwargs: dict[str, Any] = {}
+    if hasattr(tarfile, 'fully_trusted_filter'):
+        # allow symlinks to absolute paths (automake --add-missing);
+        # member names have been checked already
+        kwargs['filter'] = 'fully_trusted'
+
+    files = []
+    with tar:
+        for info in tar:
+            name = os.path.normpath(info.name)
+            if os.path.isabs(name) or name.startswith('..'):
+                raise RuntimeError('Malformed bootstrap cache file: ' + path)
+
+            full = os.path.join(src, name)
+            try:
+                os.unlink(full)
+            except FileNotFoundError:
+                pass
+            tar.extract(info, src, set_attrs=not info.issym(), **kwargs)
+            if not info.issym():
+                os.chmod(full, info.mode)
+                os.utime(full, (now, now))
+            files.append(name)
+    return files
+
+def __store(path: str, src: str, files: Iterable[str]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with tarfile.open(tmp_path, 'w:') as tar:
+        for name in sorted(files):
+            tar.add(os.path.join(src, name), arcname=name, recursive=False)
+    os.replace(tmp_path, path)
+
+def bootstrap(key: str, src: str, function: Callable[[], None]) -> None:
+    """Generate the build system of the given source tree by calling
+    function(), or restore the files it has generated in an earlier
+    run with the same key."""
+
+    stamp_path = os.path.join(src, STAMP_FILE)
+    try:
+        with open(stamp_path) as f:
+            if f.read() == key:
+                # this tree has been bootstrapped already; restoring
+                # the files again would make them look modified, and
+                # make would re-run configure
+                return
+    except FileNotFoundError:
+        pass
+
+    # a tree which has been bootstrapped already (with a different key)
+    # must not contain the old generated files: only files which change
+    # are recorded below; if they are unknown, the whole tree is
+    # recorded
+    known = not os.path.exists(stamp_path) or __remove_generated(src)
+
+    path = os.path.join(cache_path, 'autoreconf', key + '.tar')
+    with file_lock(path + '.lock'):
+        files = __restore(path, src)
+        if files is None:
+            before = scan_tree(src) if known else {}
+
+            function()
+            after = scan_tree(src)
+
+            files = [name for name, stat in after.items()
+                     if before.get(name) != stat and not __is_excluded(name)]
+            __store(path, src, files)
+
+    with open(os.path.join(src, FILES_FILE), 'w') as f:
+        f.write(''.join(name + '\n' for name in sorted(files)))
+    with open(stamp_path, 'w') as f:
+        f.write(key)
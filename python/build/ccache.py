@@ -0,0 +1,120 @@
+import functools
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+# don't hash the modification/change time of included headers (only
+# their contents) and don't refuse to cache sources using __DATE__ or
+# __TIME__; "system_headers" is deliberately not used because the
+# install prefix (which changes during the build) is passed with
+# -isystem, and its headers must be hashed
+CCACHE_SLOPPINESS = 'include_file_mtime,include_file_ctime,time_macros'
+
+__lock = threading.Lock()
+__stats: dict[str, tuple[int, int]] = {}
+
+@functools.cache
+def get_launcher() -> Optional[str]:
+    """Return the path of the compiler cache program, or None if there
+    is none.  The environment variable MPD_COMPILER_CACHE selects
+    "ccache" (the default), "sccache" or "none"."""
+
+    name = os.environ.get('MPD_COMPILER_CACHE', 'ccache')
+    if name in ('', 'none'):
+        return None
+    if name not in ('ccache', 'sccache'):
+        raise RuntimeError('Unsupported MPD_COMPILER_CACHE: ' + name)
+    return shutil.which(name)
+
+def __is_sccache() -> bool:
+    launcher = get_launcher()
+    return launcher is not None and os.path.basename(launcher).startswith('sccache')
+
+def with_launcher(command: str) -> str:
+    launcher = get_launcher()
+    if launcher is None:
+        return command
+    return f'{launcher} {command}'
+
+def apply(env: MutableMapping[str, str], base_dir: str) -> None:
+    """Configure the compiler cache for all compilers running in the
+    given environment.  All paths below base_dir are hashed relative
+    to the working directory, so the cache can be shared by checkouts
+    in different locations.  Settings in the environment take
+    precedence."""
+
+    if get_launcher() is None:
+        return
+
+    # a base directory is only useful below the root directory (which
+    # is the common path if e.g. the install prefix is on a different
+    # tree); otherwise, every path would be rewritten as relative
+    has_base_dir = os.path.dirname(base_dir) != base_dir
+
+    if __is_sccache():
+        # sccache uses its local disk cache unless configured otherwise
+        if has_base_dir:
+            env.setdefault('SCCACHE_BASEDIRS', base_dir)
+        return
+
+    if has_base_dir:
+        env.setdefault('CCACHE_BASEDIR', base_dir)
+    env.setdefault('CCACHE_SLOPPINESS', CCACHE_SLOPPINESS)
+    env.setdefault('CCACHE_COMPRESS', '1')
+
+    # with -g, ccache hashes the working directory (because it is
+    # written into the debug info), which would defeat CCACHE_BASEDIR
+    env.setdefault('CCACHE_NOHASHDIR', '1')
+
+def __read_stats_log(path: str) -> tuple[int, int]:
+    """Count the cache hits and misses in a ccache stats log (see
+    CCACHE_STATSLOG), which has one line per counter increment."""
+
+    hits = misses = 0
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line in ('direct_cache_hit', 'preprocessed_cache_hit'):
+                hits += 1
+            elif line == 'cache_miss':
+                misses += 1
+    return hits, misses
+
+@contextmanager
+def record(name: str, env: dict[str, str]) -> Iterator[dict[str, str]]:
+    """Record the cache hits and misses of a project build.  This
+    yields a copy of the given environment with a private ccache stats
+    log, which the build must use, so concurrent builds are counted
+    separately.  Nothing is recorded with sccache, which only has
+    global counters."""
+
+    if get_launcher() is None or __is_sccache():
+        yield env
+        return
+
+    fd, path = tempfile.mkstemp(prefix='mpd-ccache-', suffix='.log')
+    os.close(fd)
+    try:
+        yield {**env, 'CCACHE_STATSLOG': path}
+        hits, misses = __read_stats_log(path)
+    finally:
+        os.unlink(path)
+
+    with __lock:
+        old_hits, old_misses = __stats.get(name, (0, 0))
+        __stats[name] = (old_hits + hits, old_misses + misses)
+
+def print_summary() -> None:
+    with __lock:
+        stats = sorted(__stats.items())
+
+    for name, (hits, misses) in stats:
+        total = hits + misses
+        if total > 0:
+            print(f"compiler cache {name}: {hits} hits, {misses} misses"
+                  f" ({100 * hits // total}% hit rate)")
@@ -1,10 +1,12 @@
+import io
 import os
 import re
-import subprocess
 from typing import cast, Optional, Sequence, TextIO, Union
 from collections.abc import Mapping
 
 from build.project import Project
+from build import jobs, jobserver, trace
+from .fsutil import write_content_addressed
 from .toolchain import AnyToolchain
 
 def __write_cmake_compiler(f: TextIO, language: str, compiler: str) -> None:
@@ -35,6 +37,12 @@ set(CMAKE_CXX_FLAGS_INIT "{toolchain.cxxflags} {toolchain.cppflags}")
     __write_cmake_compiler(f, 'C', toolchain.cc)
     __write_cmake_compiler(f, 'CXX', toolchain.cxx)
 
+    # the same binutils as the other build systems, e.g. the gcc-ar
+    # wrappers which are needed for LTO objects
+    print(f'set(CMAKE_AR {toolchain.ar})', file=f)
+    print(f'set(CMAKE_RANLIB {toolchain.ranlib})', file=f)
+    print(f'set(CMAKE_NM {toolchain.nm})', file=f)
+
     if cmake_system_name == 'Darwin':
         # On macOS, cmake forcibly adds an "-isysroot" flag even if
         # one is already present in the flags variable; this breaks
@@ -63,6 +71,17 @@ set(CMAKE_FIND_ROOT_PATH_MODE_LIBRARY ONLY)
 set(CMAKE_FIND_ROOT_PATH_MODE_INCLUDE ONLY)
 """)
 
+def get_toolchain_file(toolchain: AnyToolchain) -> str:
+    """Write a CMake toolchain file for the given toolchain and return
+    its path.  All projects share it, and its name contains a hash of
+    its contents, so it is never modified, and CMake does not need to
+    re-run only because of a new time stamp."""
+
+    with io.StringIO() as f:
+        __write_cmake_toolchain_file(f, toolchain)
+        return write_content_addressed(toolchain.build_path, 'cmake-toolchain',
+                                       '.cmake', f.getvalue())
+
 def configure(toolchain: AnyToolchain, src: str, build: str, args: list[str]=[], env: Optional[Mapping[str, str]]=None) -> None:
     cross_args: list[str] = []
 
@@ -90,11 +109,7 @@ def configure(toolchain: AnyToolchain, src: str, build: str, args: list[str]=[],
         if not toolchain.is_android and not toolchain.is_darwin:
             cross_args.append('-DCMAKE_SYSROOT=' + toolchain.install_prefix)
 
-        cmake_toolchain_file = os.path.join(build, 'cmake_toolchain_file')
-        with open(cmake_toolchain_file, 'w') as f:
-            __write_cmake_toolchain_file(f, toolchain)
-
-        configure.append('-DCMAKE_TOOLCHAIN_FILE=' + cmake_toolchain_file)
+        configure.append('-DCMAKE_TOOLCHAIN_FILE=' + get_toolchain_file(toolchain))
 
     if env is None:
         env = toolchain.env
@@ -102,7 +117,8 @@ def configure(toolchain: AnyToolchain, src: str, build: str, args: list[str]=[],
         env = {**toolchain.env, **env}
 
     print(configure)
-    subprocess.check_call(configure, env=env, cwd=build)
+    with trace.span('configure'):
+        trace.check_call(configure, env=env, cwd=build)
 
 class CmakeProject(Project):
     def __init__(self, url: Union[str, Sequence[str]], md5: str, installed: str,
@@ -115,16 +131,37 @@ class CmakeProject(Project):
         self.windows_configure_args = windows_configure_args
         self.env = env
 
+    def get_fingerprint_inputs(self, toolchain: AnyToolchain) -> list[str]:
+        return Project.get_fingerprint_inputs(self, toolchain) + [
+            f'configure_args={self.configure_args!r}',
+            f'windows_configure_args={self.windows_configure_args!r}',
+            f'env={sorted(self.env.items()) if self.env is not None else None!r}',
+        ]
+
     def configure(self, toolchain: AnyToolchain) -> str:
         src = self.unpack(toolchain)
+        build = self.get_configured_build_path(toolchain)
+        if build is not None:
+            # ninja re-runs cmake if CMakeLists.txt has been modified
+            return build
+
         build = self.make_build_path(toolchain)
         configure_args = self.configure_args
         if toolchain.is_windows:
             configure_args = configure_args + self.windows_configure_args
+        configure_args = configure_args + self.get_profile_args(toolchain)
         configure(toolchain, src, build, configure_args, self.env)
+        self.mark_configured(toolchain, build)
         return build
 
-    def _build(self, toolchain: AnyToolchain) -> None:
-        build = self.configure(toolchain)
-        subprocess.check_call(['ninja', '-v', 'install'],
-                              cwd=build, env=toolchain.env)
+    def is_jobserver_client(self) -> bool:
+        js = jobserver.get()
+        return js is not None and js.ninja_supported
+
+    def compile(self, toolchain: AnyToolchain, build: str) -> None:
+        trace.check_call(['ninja', '-v'] + jobs.get_ninja_jobs_args(self.memory_per_job),
+                         cwd=build, env=toolchain.env)
+
+    def install(self, toolchain: AnyToolchain, build: str, destdir: str) -> None:
+        trace.check_call(['ninja', '-v', 'install'],
+                         cwd=build, env={**toolchain.env, 'DESTDIR': destdir})
@@ -0,0 +1,85 @@
+import hashlib
+import os
+import re
+from typing import Iterable, Optional
+
+from .dirs import cache_path
+from .fsutil import write_atomic
+from .lock import file_lock
+
+# cache variables which describe the toolchain and may be shared by
+# all projects; everything else (e.g. pkg-config results and
+# project-specific macros) stays private to one configure run
+SHARED_PREFIXES = ('ac_cv_', 'am_cv_', 'lt_cv_')
+
+# cache variables whose results (positive or negative) depend on what
+# has already been installed into the prefix or on the project's LIBS,
+# not only on the toolchain; they are never shared
+INSTALL_DEPENDENT_PREFIXES = ('ac_cv_header_', 'ac_cv_lib_', 'ac_cv_search_',
+                              'ac_cv_func_')
+
+__line_re = re.compile(r'^(?:test "\$\{(\w+)\+set\}" = set \|\| )?(\w+)=(.*)$')
+
+def get_cache_file(host_triplet: Optional[str], args: Iterable[str]) -> str:
+    """Return the path of the shared cache file for the given host and
+    configure variables (CC, CFLAGS, ...)."""
+
+    digest = hashlib.sha256('\n'.join(args).encode()).hexdigest()[:16]
+    return os.path.join(cache_path, 'autoconf',
+                        f'{host_triplet or "native"}-{digest}.cache')
+
+def __is_shareable(name: str) -> bool:
+    if not name.startswith(SHARED_PREFIXES):
+        return False
+
+    # precious variables (ac_cv_env_*) are compared with the current
+    # values by configure, which fails if they differ
+    if name.startswith('ac_cv_env_'):
+        return False
+
+    if name.startswith(INSTALL_DEPENDENT_PREFIXES):
+        return False
+
+    return True
+
+def __parse(path: str) -> dict[str, str]:
+    """Load all shareable entries from a config.cache file; the result
+    maps variable names to the whole line."""
+
+    result: dict[str, str] = {}
+    try:
+        f = open(path)
+    except FileNotFoundError:
+        return result
+
+    with f:
+        for line in f:
+            line = line.rstrip('\n')
+            m = __line_re.match(line)
+            if m is not None and __is_shareable(m.group(2)):
+                result[m.group(2)] = line
+    return result
+
+def __format(entries: dict[str, str]) -> str:
+    return ''.join(line + '\n' for _, line in sorted(entries.items()))
+
+def load(shared_path: str, cache_file: str) -> None:
+    """Seed a project's cache file from the shared cache."""
+
+    with file_lock(shared_path + '.lock'):
+        entries = __parse(shared_path)
+    with open(cache_file, 'w') as f:
+        f.write(__format(entries))
+
+def merge(shared_path: str, cache_file: str) -> None:
+    """Add new results of a successful configure run to the shared
+    cache."""
+
+    new_entries = __parse(cache_file)
+    os.makedirs(os.path.dirname(shared_path), exist_ok=True)
+    with file_lock(shared_path + '.lock'):
+        entries = __parse(shared_path)
+        if all(entries.get(name) == line for name, line in new_entries.items()):
+            return
+        entries.update(new_entries)
+        write_atomic(shared_path, __format(entries))
@@ -7,3 +7,6 @@ if 'MPD_SHARED_LIB' in os.environ:
     shared_path = os.environ['MPD_SHARED_LIB']
 tarball_path = os.path.join(shared_path, 'download')
 src_path = os.path.join(shared_path, 'src')
+
+# caches which speed up repeated builds (see MPD_ARTIFACT_CACHE)
+cache_path = os.path.join(shared_path, 'cache')
@@ -1,9 +1,22 @@
-from typing import Sequence, Union
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, BinaryIO, Iterable, Optional, Sequence, Union
 import os
+import re
 import sys
+import urllib.error
 import urllib.request
 
-from .verify import verify_file_digest
+from .lock import file_lock
+from .verify import feed_file_path, guess_digest_algorithm, record_file_digest, verify_file_digest
+
+# how many times to retry (and resume) an interrupted download
+DOWNLOAD_ATTEMPTS = 3
+
+# timeout for connecting and for each read [seconds]
+DOWNLOAD_TIMEOUT = 60
+
+# files which have already been verified by this process
+__verified: set[tuple[str, str]] = set()
 
 def __to_string_sequence(x: Union[str, Sequence[str]]) -> Sequence[str]:
     if isinstance(x, str):
@@ -17,22 +30,144 @@ def __get_any(x: Union[str, Sequence[str]]) -> str:
     else:
         return x[0]
 
-def __download_one(url: str, path: str) -> None:
-    print("download", url)
-    urllib.request.urlretrieve(url, path)
+def __open(url: str, offset: int) -> BinaryIO:
+    request = urllib.request.Request(url)
+    if offset > 0:
+        request.add_header('Range', f'bytes={offset}-')
+    return urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT)
+
+def __is_range_not_satisfiable(e: Optional[BaseException]) -> bool:
+    return isinstance(e, urllib.error.HTTPError) and e.code == 416
+
+def __close_response(future: Future[BinaryIO]) -> None:
+    if future.exception() is None:
+        future.result().close()
+
+def __race(urls: Sequence[str], offset: int) -> tuple[str, BinaryIO]:
+    """Connect to all mirrors at the same time and return the first one
+    which responds; the other responses are discarded.  If all fail,
+    a 416 error is preferred, because it means that the partial file
+    is probably complete."""
+
+    if len(urls) == 1:
+        return urls[0], __open(urls[0], offset)
+
+    executor = ThreadPoolExecutor(max_workers=len(urls))
+    futures = {executor.submit(__open, url, offset): url for url in urls}
+    executor.shutdown(wait=False)
+
+    error: Optional[BaseException] = None
+    pending = set(futures)
+    while pending:
+        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            e = future.exception()
+            if e is not None:
+                print("download error:", futures[future], e)
+                if not __is_range_not_satisfiable(error):
+                    error = e
+                continue
+
+            # the winner; close all late responses
+            for other in futures:
+                if other is not future:
+                    other.add_done_callback(__close_response)
+            return futures[future], future.result()
+
+    assert(error is not None)
+    raise error
+
+def __resume_offset(response: BinaryIO, offset: int) -> Optional[int]:
+    """Determine where the response body starts; this is the requested
+    offset if the server honored the Range header, else zero.  Returns
+    None if the server sent a different range, which cannot be
+    used."""
+
+    if offset == 0 or getattr(response, 'status', None) != 206:
+        return 0
+
+    m = re.match(r'bytes (\d+)-', response.headers.get('Content-Range', ''))
+    if not m or int(m.group(1)) != offset:
+        return None
+
+    return offset
+
+def __download_from(urls: Sequence[str], path: str, algorithm: Any) -> str:
+    """Download the file from the fastest mirror; a partial file which
+    already exists at the given path is resumed (if the server supports
+    Range requests).
+
+    The data is hashed while it is being written, and the hexadecimal
+    digest of the whole file is returned."""
+
+    try:
+        offset = os.path.getsize(path)
+    except FileNotFoundError:
+        offset = 0
+
+    try:
+        url, response = __race(urls, offset)
+    except urllib.error.HTTPError as e:
+        if not __is_range_not_satisfiable(e) or offset == 0:
+            raise
+
+        # "Range Not Satisfiable": the partial file is probably
+        # complete already (e.g. the process was killed before
+        # renaming it); the caller verifies its digest
+        print("download", __get_any(urls), "already complete")
+        h = algorithm()
+        feed_file_path(h, path)
+        return h.hexdigest()
+
+    with response:
+        resume_offset = __resume_offset(response, offset)
+        if resume_offset is None:
+            # unusable response; start over
+            print("download", url, "unexpected Content-Range, restarting")
+            response.close()
+            os.unlink(path)
+            return __download_from(urls, path, algorithm)
+
+        offset = resume_offset
+        h = algorithm()
+        if offset > 0:
+            print("download", url, "resuming at", offset)
+            feed_file_path(h, path)
+        else:
+            print("download", url)
+
+        length = response.headers.get('Content-Length')
+
+        with open(path, 'r+b' if offset > 0 else 'wb') as f:
+            f.seek(offset)
+            f.truncate()
+            while True:
+                data = response.read(1024 * 1024)
+                if len(data) == 0:
+                    break
+                f.write(data)
+                h.update(data)
+
+            # the connection may be closed prematurely without an error
+            if length is not None and f.tell() != offset + int(length):
+                raise RuntimeError(f"Download incomplete after {f.tell()} bytes")
+
+    return h.hexdigest()
 
-def __download(urls: Sequence[str], path: str) -> None:
-    for url in urls[:-1]:
+def __download(urls: Sequence[str], path: str, algorithm: Any) -> str:
+    for i in range(DOWNLOAD_ATTEMPTS - 1):
         try:
-            __download_one(url, path)
-            return
-        except:
-            print("download error:", sys.exc_info()[0])
-    __download_one(urls[-1], path)
+            return __download_from(urls, path, algorithm)
+        except Exception:
+            print("download error:", sys.exc_info()[1])
+    return __download_from(urls, path, algorithm)
 
 def __download_and_verify_to(urls: Sequence[str], md5: str, path: str) -> None:
-    __download(urls, path)
-    if not verify_file_digest(path, md5):
+    algorithm = guess_digest_algorithm(md5)
+    assert(algorithm is not None)
+    if __download(urls, path, algorithm) != md5:
+        # don't attempt to resume this file next time
+        os.unlink(path)
         raise RuntimeError("Digest mismatch")
 
 def download_basename(urls: Union[str, Sequence[str]]) -> str:
@@ -46,14 +181,35 @@ def download_and_verify(urls: Union[str, Sequence[str]], md5: str, parent_path:
     os.makedirs(parent_path, exist_ok=True)
     path = os.path.join(parent_path, base)
 
-    try:
-        if verify_file_digest(path, md5): return path
-        os.unlink(path)
-    except FileNotFoundError:
-        pass
+    with file_lock(path + '.lock'):
+        if (path, md5) in __verified:
+            return path
+
+        try:
+            if verify_file_digest(path, md5):
+                __verified.add((path, md5))
+                return path
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+        tmp_path = path + '.tmp'
+
+        __download_and_verify_to(__to_string_sequence(urls), md5, tmp_path)
+        os.rename(tmp_path, path)
+
+        # the digest was calculated while downloading; remember it so
+        # the file does not need to be read again
+        record_file_digest(path, guess_digest_algorithm(md5)().name, md5)
+        __verified.add((path, md5))
+        return path
 
-    tmp_path = path + '.tmp'
+def download_all(downloads: Iterable[tuple[Union[str, Sequence[str]], str]],
+                 parent_path: str, max_workers: int=8) -> list[str]:
+    """Download and verify several files in parallel (see
+    download_and_verify()), and return their local paths."""
 
-    __download_and_verify_to(__to_string_sequence(urls), md5, tmp_path)
-    os.rename(tmp_path, path)
-    return path
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(download_and_verify, urls, md5, parent_path)
+                   for urls, md5 in downloads]
+    return [future.result() for future in futures]
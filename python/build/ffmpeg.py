@@ -1,6 +1,7 @@
-import os.path, subprocess
+import os.path
 
 from build.project import Project
+from build import jobs, trace
 
 class FfmpegProject(Project):
     def __init__(self, url, md5, installed, configure_args=[],
@@ -10,10 +11,28 @@ class FfmpegProject(Project):
         self.configure_args = configure_args
         self.cppflags = cppflags
 
-    def _build(self, toolchain):
+    def get_fingerprint_inputs(self, toolchain):
+        return Project.get_fingerprint_inputs(self, toolchain) + [
+            f'configure_args={self.configure_args!r}',
+            'cppflags=' + self.cppflags,
+        ]
+
+    def configure(self, toolchain):
         src = self.unpack(toolchain)
-        build = self.make_build_path(toolchain)
+        build = self.get_configured_build_path(toolchain)
+        if build is None:
+            build = self.make_build_path(toolchain)
+            self.__run_configure(toolchain, src, build)
+            self.mark_configured(toolchain, build)
+        return build
+
+    def compile(self, toolchain, build):
+        trace.check_call(['/usr/bin/make', '--quiet'] + jobs.get_make_jobs_args(self.memory_per_job), cwd=build, env=toolchain.env)
+
+    def install(self, toolchain, build, destdir):
+        trace.check_call(['/usr/bin/make', '--quiet', 'install', 'DESTDIR=' + destdir], cwd=build, env=toolchain.env)
 
+    def __run_configure(self, toolchain, src, build):
         if toolchain.is_arm:
             arch = 'arm'
         elif toolchain.is_aarch64:
@@ -41,11 +60,10 @@ class FfmpegProject(Project):
             '--arch=' + arch,
             '--target-os=' + target_os,
             '--prefix=' + toolchain.install_prefix,
-        ] + self.configure_args
+        ] + self.configure_args + self.get_profile_args(toolchain)
 
         if toolchain.is_armv7:
             configure.append('--cpu=cortex-a8')
 
-        subprocess.check_call(configure, cwd=build, env=toolchain.env)
-        subprocess.check_call(['/usr/bin/make', '--quiet', '-j12'], cwd=build, env=toolchain.env)
-        subprocess.check_call(['/usr/bin/make', '--quiet', 'install'], cwd=build, env=toolchain.env)
+        with trace.span('configure'):
+            trace.check_call(configure, cwd=build, env=toolchain.env)
@@ -0,0 +1,67 @@
+import hashlib
+import os
+
+def scan_tree(path: str) -> dict[str, tuple[int, int]]:
+    """Return the size and modification time of all files in the given
+    directory tree, keyed by their relative path."""
+
+    result = {}
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in filenames + [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]:
+            full = os.path.join(dirpath, name)
+            st = os.lstat(full)
+            result[os.path.relpath(full, path)] = (st.st_size, st.st_mtime_ns)
+    return result
+
+def move_tree(src: str, dst: str) -> list[str]:
+    """Move all files and symlinks from one directory tree into
+    another one, replacing existing files, and return their relative
+    paths."""
+
+    result = []
+    for dirpath, dirnames, filenames in os.walk(src):
+        rel = os.path.relpath(dirpath, src)
+        os.makedirs(os.path.normpath(os.path.join(dst, rel)), exist_ok=True)
+        for name in filenames + [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]:
+            name = os.path.normpath(os.path.join(rel, name))
+            os.replace(os.path.join(src, name), os.path.join(dst, name))
+            result.append(name)
+    return result
+
+def write_atomic(path: str, data: str) -> None:
+    """Write a file atomically, i.e. readers see either the old or the
+    new contents, but never a partial file."""
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def write_if_changed(path: str, data: str) -> bool:
+    """Write a file unless it already has the given contents; this
+    keeps its time stamp, so build systems which depend on it do not
+    consider it modified.  Returns True if the file was written."""
+
+    try:
+        with open(path) as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+
+    write_atomic(path, data)
+    return True
+
+def write_content_addressed(directory: str, prefix: str, suffix: str,
+                            data: str) -> str:
+    """Write a file whose name contains a hash of its contents and
+    return its path.  An existing file is never modified, so its time
+    stamp changes only if the contents change (by getting a new
+    name)."""
+
+    digest = hashlib.sha256(data.encode()).hexdigest()[:16]
+    path = os.path.join(directory, f'{prefix}-{digest}{suffix}')
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        write_atomic(path, data)
+    return path
@@ -0,0 +1,38 @@
+import hashlib
+import os
+from typing import Iterable
+
+# a file inside build directories containing a hash of the settings
+# they were configured with
+STAMP_FILE = '.mpd-configure-stamp'
+
+def is_enabled() -> bool:
+    """Incremental builds are enabled by default; with
+    MPD_INCREMENTAL=0, every build starts with an empty build
+    directory."""
+
+    return os.environ.get('MPD_INCREMENTAL', '1') != '0'
+
+def __get_digest(inputs: Iterable[str]) -> str:
+    h = hashlib.sha256()
+    for x in inputs:
+        h.update(x.encode() + b'\0')
+    return h.hexdigest()
+
+def is_configured(build: str, inputs: Iterable[str]) -> bool:
+    """Was the given build directory configured successfully with the
+    given settings?  Then configure does not need to run again, and
+    the build system will only rebuild what has changed."""
+
+    if not is_enabled():
+        return False
+
+    try:
+        with open(os.path.join(build, STAMP_FILE)) as f:
+            return f.read() == __get_digest(inputs)
+    except FileNotFoundError:
+        return False
+
+def mark_configured(build: str, inputs: Iterable[str]) -> None:
+    with open(os.path.join(build, STAMP_FILE), 'w') as f:
+        f.write(__get_digest(inputs))
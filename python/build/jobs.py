@@ -0,0 +1,192 @@
+import functools
+import multiprocessing
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from . import jobserver
+
+__local = threading.local()
+
+# the default estimate of how much memory one compiler process needs
+# [bytes]; projects with heavy C++ code can declare more (see
+# Project.memory_per_job)
+DEFAULT_MEMORY_PER_JOB = 512 * 1024 * 1024
+
+def __read_cgroup(v2_name: str, v1_controller: str, v1_name: str) -> Optional[str]:
+    """Read a setting of the cgroup this process belongs to, trying
+    both the unified (v2) and the legacy (v1) hierarchy."""
+
+    try:
+        with open('/proc/self/cgroup') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+
+    candidates = []
+    for line in lines:
+        _, controllers, path = line.split(':', 2)
+        path = path.lstrip('/')
+        if controllers == '':
+            for root in ('/sys/fs/cgroup', '/sys/fs/cgroup/unified'):
+                candidates += [os.path.join(root, path, v2_name),
+                               os.path.join(root, v2_name)]
+        elif v1_controller in controllers.split(','):
+            for root in (os.path.join('/sys/fs/cgroup', controllers),
+                         os.path.join('/sys/fs/cgroup', v1_controller)):
+                candidates += [os.path.join(root, path, v1_name),
+                               os.path.join(root, v1_name)]
+
+    for path in candidates:
+        try:
+            with open(path) as f:
+                return f.read().strip()
+        except OSError:
+            pass
+    return None
+
+def __get_cgroup_cpu_limit() -> Optional[float]:
+    cpu_max = __read_cgroup('cpu.max', 'cpu', 'cpu.cfs_quota_us')
+    if cpu_max is None:
+        return None
+
+    quota = cpu_max.split()[0]
+    if quota in ('max', '-1'):
+        return None
+
+    if len(cpu_max.split()) > 1:
+        # v2: "QUOTA PERIOD"
+        period = cpu_max.split()[1]
+    else:
+        # v1: separate file
+        period = __read_cgroup('', 'cpu', 'cpu.cfs_period_us') or '100000'
+    return int(quota) / int(period)
+
+@functools.cache
+def get_cpu_count() -> int:
+    """Return the number of CPUs this process may use, taking the
+    affinity mask and cgroup CPU quotas into account."""
+
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        try:
+            count = multiprocessing.cpu_count()
+        except NotImplementedError:
+            return 6
+
+    quota = __get_cgroup_cpu_limit()
+    if quota is not None:
+        count = min(count, max(1, int(quota + 0.5)))
+
+    return count
+
+def get_available_memory() -> Optional[int]:
+    """Return the amount of memory available for the build [bytes], or
+    None if that is unknown.  This considers both the system's free
+    memory and the cgroup memory limit."""
+
+    result = None
+
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    result = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    limit = __read_cgroup('memory.max', 'memory', 'memory.limit_in_bytes')
+    if limit is not None and limit != 'max':
+        usage = __read_cgroup('memory.current', 'memory', 'memory.usage_in_bytes')
+        available = int(limit) - int(usage or 0)
+        # v1 reports "unlimited" as a huge number
+        if result is None or available < result:
+            result = available
+
+    return result
+
+def get_memory_jobs(memory_per_job: int=DEFAULT_MEMORY_PER_JOB) -> Optional[int]:
+    """Return how many jobs fit into the available memory, or None if
+    unknown."""
+
+    memory = get_available_memory()
+    if memory is None:
+        return None
+    return max(1, memory // memory_per_job)
+
+def get_default_jobs() -> int:
+    """Return the total number of parallel jobs for the build.  The
+    environment variable MPD_BUILD_JOBS overrides the calculation."""
+
+    if 'MPD_BUILD_JOBS' in os.environ:
+        value = os.environ['MPD_BUILD_JOBS']
+        try:
+            jobs = int(value)
+        except ValueError:
+            jobs = 0
+        if jobs < 1:
+            raise SystemExit(f'MPD_BUILD_JOBS must be a positive number, not {value!r}')
+        return jobs
+
+    # use twice as many simultaneous jobs as we have CPU cores, unless
+    # that would exceed the available memory
+    jobs = get_cpu_count() * 2
+    memory_jobs = get_memory_jobs()
+    if memory_jobs is not None:
+        jobs = min(jobs, memory_jobs)
+    return jobs
+
+def get_simultaneous_jobs(memory_per_job: int=DEFAULT_MEMORY_PER_JOB) -> int:
+    """Return the number of parallel jobs the calling thread may use
+    for make/ninja; this is the share granted by the scheduler, or the
+    default if it runs outside of a scheduler.  It is reduced further
+    if there is not enough memory for the given per-job estimate."""
+
+    jobs = getattr(__local, 'jobs', None)
+    if jobs is None:
+        jobs = get_default_jobs()
+
+    if 'MPD_BUILD_JOBS' not in os.environ:
+        memory_jobs = get_memory_jobs(memory_per_job)
+        if memory_jobs is not None:
+            jobs = min(jobs, memory_jobs)
+    return jobs
+
+def __is_memory_limited(memory_per_job: int, jobs: int) -> bool:
+    memory_jobs = get_memory_jobs(memory_per_job)
+    return memory_jobs is not None and memory_jobs < jobs
+
+def get_make_jobs_args(memory_per_job: int=DEFAULT_MEMORY_PER_JOB) -> list[str]:
+    """Return the make arguments which set the number of parallel
+    jobs.  With a jobserver, there are usually none: make takes its
+    tokens from the jobserver (and an explicit -j would override it).
+    Only if the jobserver would allow more jobs than fit into memory,
+    an explicit (smaller) -j is passed."""
+
+    js = jobserver.get()
+    if js is not None and not __is_memory_limited(memory_per_job, js.jobs):
+        return []
+    return ['-j' + str(get_simultaneous_jobs(memory_per_job))]
+
+def get_ninja_jobs_args(memory_per_job: int=DEFAULT_MEMORY_PER_JOB) -> list[str]:
+    """Like get_make_jobs_args(), but for ninja, which is a jobserver
+    client only since version 1.13."""
+
+    js = jobserver.get()
+    if js is not None and js.ninja_supported and \
+       not __is_memory_limited(memory_per_job, js.jobs):
+        return []
+    return ['-j' + str(get_simultaneous_jobs(memory_per_job))]
+
+@contextmanager
+def limit(jobs: int) -> Iterator[None]:
+    """Limit the number of parallel jobs for the calling thread."""
+
+    old = getattr(__local, 'jobs', None)
+    __local.jobs = jobs
+    try:
+        yield
+    finally:
+        __local.jobs = old
@@ -0,0 +1,141 @@
+import atexit
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+def _get_version(program: str) -> tuple[int, ...]:
+    try:
+        output = subprocess.check_output([program, '--version'], text=True)
+    except (FileNotFoundError, subprocess.CalledProcessError):
+        return ()
+    m = re.search(r'(\d+)\.(\d+)', output)
+    if not m:
+        return ()
+    return (int(m.group(1)), int(m.group(2)))
+
+class Jobserver:
+    """A GNU make jobserver using a named pipe.  Every make (4.4 or
+    newer) and ninja (1.13 or newer) which inherits MAKEFLAGS takes its
+    job tokens from here, which limits the total number of jobs of all
+    concurrent builds.
+
+    Every client assumes that it owns one job implicitly, so the
+    drivers (see acquire()) hold a token for each client they start;
+    only the process which created the jobserver has one implicit job
+    to give away."""
+
+    def __init__(self, jobs: int, path: Optional[str]=None):
+        self.jobs = jobs
+        self.__tmp_path: Optional[str] = None
+        self.__lock = threading.Lock()
+        self.__implicit = path is None
+
+        if path is None:
+            # create a new jobserver
+            self.__tmp_path = tempfile.mkdtemp(prefix='mpd-jobserver-')
+            path = os.path.join(self.__tmp_path, 'fifo')
+            os.mkfifo(path)
+
+            # keep the pipe open for reading and writing, so it never
+            # reports EOF and the tokens remain in the pipe while no
+            # client is running; each client implicitly owns one job,
+            # so there is one token less than jobs
+            self.__fd: Optional[int] = os.open(path, os.O_RDWR)
+            os.write(self.__fd, b'+' * (jobs - 1))
+        else:
+            # an existing jobserver owned by our parent process
+            self.__fd = None
+
+        self.path = path
+        self.ninja_supported = _get_version('ninja') >= (1, 13)
+
+    @property
+    def makeflags(self) -> str:
+        return f'-j{self.jobs} --jobserver-auth=fifo:{self.path}'
+
+    def apply(self, env: MutableMapping[str, str]) -> None:
+        """Make all processes using this environment clients of this
+        jobserver."""
+
+        env['MAKEFLAGS'] = self.makeflags
+
+    @contextmanager
+    def acquire(self, n: int=1) -> Iterator[int]:
+        """Hold up to n job slots while starting a client (or a
+        non-client which runs several jobs).  This blocks until at least
+        one slot is available, takes as many more as are available
+        right now and returns how many it got."""
+
+        with self.__lock:
+            implicit = self.__implicit
+            self.__implicit = False
+
+        fd = os.open(self.path, os.O_RDWR)
+        tokens = b''
+        try:
+            if not implicit:
+                tokens = os.read(fd, 1)
+            if n > len(tokens) + implicit:
+                os.set_blocking(fd, False)
+                try:
+                    tokens += os.read(fd, n - len(tokens) - implicit)
+                except BlockingIOError:
+                    pass
+                os.set_blocking(fd, True)
+
+            yield len(tokens) + implicit
+        finally:
+            if tokens:
+                os.write(fd, tokens)
+            os.close(fd)
+            if implicit:
+                with self.__lock:
+                    self.__implicit = True
+
+    def close(self) -> None:
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
+        if self.__tmp_path is not None:
+            shutil.rmtree(self.__tmp_path, ignore_errors=True)
+            self.__tmp_path = None
+
+def __from_environment() -> Optional[Jobserver]:
+    makeflags = os.environ.get('MAKEFLAGS', '')
+    m = re.search(r'--jobserver-auth=fifo:(\S+)', makeflags)
+    if not m:
+        return None
+    j = re.search(r'(?:^|\s)-j(\d+)', makeflags)
+    return Jobserver(int(j.group(1)) if j else 1, m.group(1))
+
+__current: Optional[Jobserver] = None
+
+def get() -> Optional[Jobserver]:
+    """Return the jobserver of this process, or None if there is none."""
+
+    return __current
+
+def start(jobs: int) -> Optional[Jobserver]:
+    """Start a jobserver with the given number of jobs (or join the one
+    our parent process has passed in MAKEFLAGS).  Returns None if the
+    installed make is too old to be a client of a named pipe
+    jobserver."""
+
+    global __current
+    if __current is not None:
+        return __current
+
+    if _get_version('make') < (4, 4):
+        return None
+
+    __current = __from_environment()
+    if __current is None:
+        __current = Jobserver(jobs)
+        atexit.register(__current.close)
+    return __current
@@ -1,85 +1,61 @@
-import re
-from os.path import abspath
+import functools
+import importlib
+from typing import Any, Callable, Sequence, Union
 
-from build.project import Project
-from build.zlib import ZlibProject
-from build.cmake import CmakeProject
-from build.autotools import AutotoolsProject
-from build.ffmpeg import FfmpegProject
+from build.project import Project, get_tarball_base, parse_base
 
-libsamplerate = CmakeProject(
-    'https://github.com/libsndfile/libsamplerate/releases/download/0.2.2/libsamplerate-0.2.2.tar.xz',
-    '97c010fc25156c33cddc272c1935afab',
-    'lib/libsamplerate.a',
-    [
-        '-DBUILD_SHARED_LIBS=OFF',
-        '-DINSTALL_DOCS=OFF',
-        '-DINSTALL_CMAKE_PACKAGE_MODULE=OFF',
-    ],
-)
+# the modules implementing the project classes used by the catalog;
+# each is imported only when a library of that class is looked up
+PROJECT_MODULES = {
+    'AutotoolsProject': 'build.autotools',
+    'CmakeProject': 'build.cmake',
+    'FfmpegProject': 'build.ffmpeg',
+    'ZlibProject': 'build.zlib',
+}
 
-zlib = ZlibProject(
-    ('http://zlib.net/zlib-1.3.1.tar.xz',
-     'https://github.com/madler/zlib/releases/download/v1.3.1/zlib-1.3.1.tar.xz'),
-    '38ef96b8dfe510d42707d9c781877914792541133e1870841463bfa73f883e32',
-    'lib/libz.a',
-)
+class Library:
+    """A catalog entry: the class and constructor arguments of a
+    Project, which is created only when the library is looked up (see
+    get()).  The attributes can be queried without creating it."""
 
-libmodplug = AutotoolsProject(
-    'https://downloads.sourceforge.net/modplug-xmms/libmodplug/0.8.9.0/libmodplug-0.8.9.0.tar.gz',
-    '457ca5a6c179656d66c01505c0d95fafaead4329b9dbaa0f997d00a3508ad9de',
-    'lib/libmodplug.a',
-    [
-        '--disable-shared', '--enable-static',
-    ],
-    patches='src/lib/modplug/patches',
-)
+    def __init__(self, project_class: str,
+                 url: Union[str, Sequence[str]], md5: str, installed: str,
+                 configure_args: Union[Sequence[str], Callable[[], list[str]]]=(),
+                 **kwargs: Any):
+        self.project_class = project_class
+        self.url = url
+        self.md5 = md5
+        self.installed = installed
+        self.configure_args = configure_args
+        self.kwargs = kwargs
 
-libopenmpt = AutotoolsProject(
-    'https://lib.openmpt.org/files/libopenmpt/src/libopenmpt-0.7.9+release.autotools.tar.gz',
-    '0386e918d75d797e79d5b14edd0847165d8b359e9811ef57652c0a356a2dfcf4',
-    'lib/libopenmpt.a',
-    [
-        '--disable-shared', '--enable-static',
-        '--disable-openmpt123',
-        '--disable-examples',
-        '--disable-tests',
-        '--disable-doxygen-doc',
-        '--without-mpg123', '--without-ogg', '--without-vorbis', '--without-vorbisfile',
-        '--without-portaudio', '--without-portaudiocpp', '--without-sndfile',
-        '--without-flac',
-    ],
-    base='libopenmpt-0.7.9+release.autotools',
-)
+    @property
+    def base(self) -> str:
+        return self.kwargs.get('base') or get_tarball_base(self.url)
+
+    @property
+    def name(self) -> str:
+        return self.kwargs.get('name') or parse_base(self.base)[0]
+
+    @property
+    def version(self) -> str:
+        return self.kwargs.get('version') or parse_base(self.base)[1]
 
-wildmidi = CmakeProject(
-    'https://github.com/Mindwerks/wildmidi/releases/download/wildmidi-0.4.6/wildmidi-0.4.6.tar.gz',
-    '24ca992639ce76efa3737029fceb3672385d56e2ac0a15d50b40cc12d26e60de',
-    'lib/libWildMidi.a',
-    [
-        '-DBUILD_SHARED_LIBS=OFF',
-        '-DWANT_PLAYER=OFF',
-        '-DWANT_STATIC=ON',
-    ],
-)
+    @property
+    def depends(self) -> Sequence[str]:
+        return self.kwargs.get('depends', ())
 
-gme = CmakeProject(
-    'https://bitbucket.org/mpyne/game-music-emu/downloads/game-music-emu-0.6.3.tar.xz',
-    'aba34e53ef0ec6a34b58b84e28bf8cfbccee6585cebca25333604c35db3e051d',
-    'lib/libgme.a',
-    [
-        '-DBUILD_SHARED_LIBS=OFF',
-        '-DENABLE_UBSAN=OFF',
-        '-DZLIB_INCLUDE_DIR=OFF',
-        '-DCMAKE_DISABLE_FIND_PACKAGE_SDL2=ON',
-    ],
-)
+    def create(self) -> Project:
+        module = importlib.import_module(PROJECT_MODULES[self.project_class])
+        kwargs = dict(self.kwargs)
+        if self.configure_args:
+            configure_args = self.configure_args
+            kwargs['configure_args'] = configure_args() if callable(configure_args) else list(configure_args)
+        return getattr(module, self.project_class)(self.url, self.md5, self.installed, **kwargs)
 
-ffmpeg = FfmpegProject(
-    'http://ffmpeg.org/releases/ffmpeg-7.1.tar.xz',
-    '40973d44970dbc83ef302b0609f2e74982be2d85916dd2ee7472d30678a7abe6',
-    'lib/libavcodec.a',
-    [
+def __get_ffmpeg_configure_args() -> list[str]:
+    # built only when ffmpeg is looked up
+    return [
         '--disable-shared', '--enable-static',
         '--enable-gpl',
         '--enable-small',
@@ -519,22 +495,129 @@ ffmpeg = FfmpegProject(
         '--disable-bsf=vp9_raw_reorder',
         '--disable-bsf=vp9_superframe',
         '--disable-bsf=vp9_superframe_split',
-    ],
-)
+    ]
 
-libnfs = AutotoolsProject(
-    'https://github.com/sahlberg/libnfs/archive/libnfs-5.0.3.tar.gz',
-    'd945cb4f4c8f82ee1f3640893a168810f794a28e1010bb007ec5add345e9df3e',
-    'lib/libnfs.a',
-    [
-        '--disable-shared', '--enable-static',
-        '--disable-debug',
+CATALOG: dict[str, Library] = {
+    'libsamplerate': Library(
+        'CmakeProject',
+        'https://github.com/libsndfile/libsamplerate/releases/download/0.2.2/libsamplerate-0.2.2.tar.xz',
+        '97c010fc25156c33cddc272c1935afab',
+        'lib/libsamplerate.a',
+        [
+            '-DBUILD_SHARED_LIBS=OFF',
+            '-DINSTALL_DOCS=OFF',
+            '-DINSTALL_CMAKE_PACKAGE_MODULE=OFF',
+        ],
+    ),
+
+    'zlib': Library(
+        'ZlibProject',
+        ('http://zlib.net/zlib-1.3.1.tar.xz',
+         'https://github.com/madler/zlib/releases/download/v1.3.1/zlib-1.3.1.tar.xz'),
+        '38ef96b8dfe510d42707d9c781877914792541133e1870841463bfa73f883e32',
+        'lib/libz.a',
+    ),
+
+    'libmodplug': Library(
+        'AutotoolsProject',
+        'https://downloads.sourceforge.net/modplug-xmms/libmodplug/0.8.9.0/libmodplug-0.8.9.0.tar.gz',
+        '457ca5a6c179656d66c01505c0d95fafaead4329b9dbaa0f997d00a3508ad9de',
+        'lib/libmodplug.a',
+        [
+            '--disable-shared', '--enable-static',
+        ],
+        patches='src/lib/modplug/patches',
+    ),
+
+    'libopenmpt': Library(
+        'AutotoolsProject',
+        'https://lib.openmpt.org/files/libopenmpt/src/libopenmpt-0.7.9+release.autotools.tar.gz',
+        '0386e918d75d797e79d5b14edd0847165d8b359e9811ef57652c0a356a2dfcf4',
+        'lib/libopenmpt.a',
+        [
+            '--disable-shared', '--enable-static',
+            '--disable-openmpt123',
+            '--disable-examples',
+            '--disable-tests',
+            '--disable-doxygen-doc',
+            '--without-mpg123', '--without-ogg', '--without-vorbis', '--without-vorbisfile',
+            '--without-portaudio', '--without-portaudiocpp', '--without-sndfile',
+            '--without-flac',
+        ],
+        base='libopenmpt-0.7.9+release.autotools',
+        depends=['zlib'],
+        # heavily templated C++
+        memory_per_job=1536,
+    ),
+
+    'wildmidi': Library(
+        'CmakeProject',
+        'https://github.com/Mindwerks/wildmidi/releases/download/wildmidi-0.4.6/wildmidi-0.4.6.tar.gz',
+        '24ca992639ce76efa3737029fceb3672385d56e2ac0a15d50b40cc12d26e60de',
+        'lib/libWildMidi.a',
+        [
+            '-DBUILD_SHARED_LIBS=OFF',
+            '-DWANT_PLAYER=OFF',
+            '-DWANT_STATIC=ON',
+        ],
+    ),
+
+    'gme': Library(
+        'CmakeProject',
+        'https://bitbucket.org/mpyne/game-music-emu/downloads/game-music-emu-0.6.3.tar.xz',
+        'aba34e53ef0ec6a34b58b84e28bf8cfbccee6585cebca25333604c35db3e051d',
+        'lib/libgme.a',
+        [
+            '-DBUILD_SHARED_LIBS=OFF',
+            '-DENABLE_UBSAN=OFF',
+            '-DZLIB_INCLUDE_DIR=OFF',
+            '-DCMAKE_DISABLE_FIND_PACKAGE_SDL2=ON',
+        ],
+        depends=['zlib'],
+    ),
+
+    'ffmpeg': Library(
+        'FfmpegProject',
+        'http://ffmpeg.org/releases/ffmpeg-7.1.tar.xz',
+        '40973d44970dbc83ef302b0609f2e74982be2d85916dd2ee7472d30678a7abe6',
+        'lib/libavcodec.a',
+        __get_ffmpeg_configure_args,
+        depends=['zlib'],
+        profile_args={
+            # --enable-small trades speed for size
+            'speed': ['--disable-small'],
+            'lto': ['--enable-lto'],
+        },
+    ),
+
+    'libnfs': Library(
+        'AutotoolsProject',
+        'https://github.com/sahlberg/libnfs/archive/libnfs-5.0.3.tar.gz',
+        'd945cb4f4c8f82ee1f3640893a168810f794a28e1010bb007ec5add345e9df3e',
+        'lib/libnfs.a',
+        [
+            '--disable-shared', '--enable-static',
+            '--disable-debug',
+
+            # work around -Wtautological-compare
+            '--disable-werror',
+
+            '--disable-utils', '--disable-examples',
+        ],
+        base='libnfs-libnfs-5.0.3',
+        autoreconf=True,
+    ),
+}
+
+@functools.cache
+def get(name: str) -> Project:
+    """Look up a library in the catalog and create its Project object
+    (only once)."""
 
-        # work around -Wtautological-compare
-        '--disable-werror',
+    return CATALOG[name].create()
 
-        '--disable-utils', '--disable-examples',
-    ],
-    base='libnfs-libnfs-5.0.3',
-    autoreconf=True,
-)
+def __getattr__(name: str) -> Project:
+    # allows "from build.libs import zlib"
+    if name not in CATALOG:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return get(name)
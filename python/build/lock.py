@@ -0,0 +1,36 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # type: ignore
+
+__mutex = threading.Lock()
+__thread_locks: dict[str, threading.Lock] = {}
+
+def __get_thread_lock(path: str) -> threading.Lock:
+    with __mutex:
+        return __thread_locks.setdefault(path, threading.Lock())
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Obtain an exclusive lock on the given lock file.  This
+    serializes both threads of this process and other processes
+    (e.g. concurrent build.py invocations sharing MPD_SHARED_LIB)."""
+
+    path = os.path.abspath(path)
+    with __get_thread_lock(path):
+        if fcntl is None:
+            yield
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -1,7 +1,7 @@
-import subprocess, multiprocessing
 from typing import Optional, Sequence, Union
 
 from build.project import Project
+from build import jobs, trace
 from .toolchain import AnyToolchain
 
 class MakeProject(Project):
@@ -11,25 +11,34 @@ class MakeProject(Project):
         Project.__init__(self, url, md5, installed, **kwargs)
         self.install_target = install_target
 
+    def get_fingerprint_inputs(self, toolchain: AnyToolchain) -> list[str]:
+        return Project.get_fingerprint_inputs(self, toolchain) + [
+            'install_target=' + self.install_target,
+        ]
+
     def get_simultaneous_jobs(self) -> int:
-        try:
-            # use twice as many simultaneous jobs as we have CPU cores
-            return multiprocessing.cpu_count() * 2
-        except NotImplementedError:
-            # default to 12, if multiprocessing.cpu_count() is not implemented
-            return 12
+        return jobs.get_simultaneous_jobs(self.memory_per_job)
 
     def get_make_args(self, toolchain: AnyToolchain) -> list[str]:
-        return ['--quiet', '-j' + str(self.get_simultaneous_jobs())]
+        return ['--quiet'] + jobs.get_make_jobs_args(self.memory_per_job)
 
     def get_make_install_args(self, toolchain: AnyToolchain) -> list[str]:
         return ['--quiet', self.install_target]
 
     def make(self, toolchain: AnyToolchain, wd: str, args: list[str]) -> None:
-        subprocess.check_call(['make'] + args,
-                              cwd=wd, env=toolchain.env)
+        trace.check_call(['make'] + args,
+                         cwd=wd, env=toolchain.env)
+
+    def compile(self, toolchain: AnyToolchain, build: str) -> None:
+        self.make(toolchain, build, self.get_make_args(toolchain))
+
+    def install(self, toolchain: AnyToolchain, build: str, destdir: str) -> None:
+        self.make(toolchain, build,
+                  self.get_make_install_args(toolchain) + ['DESTDIR=' + destdir])
 
     def build_make(self, toolchain: AnyToolchain, wd: str, install: bool=True) -> None:
-        self.make(toolchain, wd, self.get_make_args(toolchain))
+        with trace.span('compile'):
+            self.make(toolchain, wd, self.get_make_args(toolchain))
         if install:
-            self.make(toolchain, wd, self.get_make_install_args(toolchain))
+            with self.installing(toolchain) as destdir:
+                self.install(toolchain, wd, destdir)
@@ -1,9 +1,15 @@
+import io
 import os
-import subprocess
 import platform
 
+from . import incremental, trace
+from .fsutil import write_content_addressed
 from .toolchain import AnyToolchain
 
+# a file inside the build directory containing the path of the cross
+# file it was set up with
+CROSS_FILE_STAMP = '.mpd-cross-file'
+
 def format_meson_cross_file_command(command: str) -> str:
     splitted = command.split()
     if len(splitted) == 1:
@@ -40,14 +46,13 @@ def make_cross_file(toolchain: AnyToolchain) -> str:
 
     # TODO: write pkg-config wrapper
 
-    path = os.path.join(toolchain.build_path, 'meson.cross')
-    os.makedirs(toolchain.build_path, exist_ok=True)
-    with open(path, 'w') as f:
+    with io.StringIO() as f:
         f.write(f"""
 [binaries]
 c = {format_meson_cross_file_command(toolchain.cc)}
 cpp = {format_meson_cross_file_command(toolchain.cxx)}
 ar = {format_meson_cross_file_command(toolchain.ar)}
+nm = {format_meson_cross_file_command(toolchain.nm)}
 strip = {format_meson_cross_file_command(toolchain.strip)}
 pkgconfig = {format_meson_cross_file_command(toolchain.pkg_config)}
 """)
@@ -61,6 +66,7 @@ pkgconfig = {format_meson_cross_file_command(toolchain.pkg_config)}
         f.write(f"""
 [properties]
 root = '{toolchain.install_prefix}'
+pkg_config_libdir = {repr(toolchain.env['PKG_CONFIG_LIBDIR'].split(os.pathsep))}
 """)
 
         if toolchain.is_android:
@@ -85,7 +91,8 @@ cpu_family = '{cpu_family}'
 cpu = '{cpu}'
 endian = '{endian}'
 """)
-    return path
+        return write_content_addressed(toolchain.build_path, 'meson', '.cross',
+                                       f.getvalue())
 
 def configure(toolchain: AnyToolchain, src: str, build: str, args: list[str]=[]) -> None:
     configure = [
@@ -99,11 +106,38 @@ def configure(toolchain: AnyToolchain, src: str, build: str, args: list[str]=[])
         '--default-library=static',
     ] + args
 
+    cross_file = ''
     if toolchain.host_triplet is not None:
-        # cross-compiling: write a cross-file
+        # cross-compiling: write a cross-file (its name contains a
+        # hash of its contents)
         cross_file = make_cross_file(toolchain)
         configure.append(f'--cross-file={cross_file}')
 
+    inputs = list(configure)
+    if incremental.is_configured(build, inputs):
+        # ninja re-runs meson if a meson.build file has been modified
+        return
+
+    cross_file_stamp = os.path.join(build, CROSS_FILE_STAMP)
+    if os.path.isdir(os.path.join(build, 'meson-private')):
+        # keep the object files of the existing build directory;
+        # meson reads the cross file only during the initial setup,
+        # so a different one requires wiping the build directory
+        try:
+            with open(cross_file_stamp) as f:
+                cross_file_changed = f.read() != cross_file
+        except FileNotFoundError:
+            cross_file_changed = True
+
+        if cross_file_changed or not incremental.is_enabled():
+            configure.append('--wipe')
+        else:
+            configure.append('--reconfigure')
+
     env = toolchain.env.copy()
 
-    subprocess.check_call(configure, env=env)
+    with trace.span('configure'):
+        trace.check_call(configure, env=env)
+    with open(cross_file_stamp, 'w') as f:
+        f.write(cross_file)
+    incremental.mark_configured(build, inputs)
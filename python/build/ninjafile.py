@@ -0,0 +1,170 @@
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+from typing import Sequence
+
+from build import jobs, jobserver, libs, targets, trace
+from build.download import download_basename
+from .fsutil import write_if_changed
+
+# a library name (see build/libs.py) and the target it is built for
+Node = tuple[str, targets.Spec]
+
+# the maximum number of concurrent downloads, like download_all()
+DOWNLOAD_JOBS = 8
+
+# the maximum number of concurrent project builds without a jobserver;
+# the job limit is split among them
+BUILD_POOL_DEPTH = 4
+
+def __escape_path(path: str) -> str:
+    return path.replace('$', '$$').replace(' ', '$ ').replace(':', '$:')
+
+def __escape_command(args: Sequence[str]) -> str:
+    return ' '.join(shlex.quote(arg) for arg in args).replace('$', '$$')
+
+def __step_command(step: str) -> str:
+    python_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return (f'PYTHONPATH={__escape_command([python_path])} '
+            f'{__escape_command([sys.executable])} -m build.step {step}'
+            ' $targets $target $library $key')
+
+def __build_jobs() -> int:
+    js = jobserver.get()
+    if js is not None:
+        # the jobserver limits the total number of jobs of all
+        # concurrent project builds
+        return js.jobs
+
+    # without a jobserver, a few projects are built concurrently, each
+    # with its share of the jobs (see run())
+    return min(BUILD_POOL_DEPTH, jobs.get_default_jobs())
+
+def generate(path: str, nodes: Sequence[Node]) -> str:
+    """Generate the contents of a build.ninja file which downloads,
+    prepares and builds the given libraries.  Each step runs
+    build/step.py, which uses the same Project methods as the
+    Scheduler.
+
+    Each step's command line contains the key of its inputs (tarball
+    digest, source key or fingerprint), so ninja repeats the step when
+    it changes.  The "build" step's output is the install manifest,
+    which is only rewritten if the project was actually built;
+    "restat" then lets ninja skip the projects depending on it.
+    """
+
+    targets_file = os.path.join(path, 'targets.json')
+    lines = [
+        'ninja_required_version = 1.5',
+        f'builddir = {__escape_path(path)}',
+        f'targets = {__escape_command([targets_file])}',
+        '',
+        'pool download',
+        f'  depth = {DOWNLOAD_JOBS}',
+        '',
+        'pool build',
+        f'  depth = {__build_jobs()}',
+        '',
+        'rule download',
+        f'  command = {__step_command("download")}',
+        '  description = download $library',
+        '  pool = download',
+        '  restat = 1',
+        '',
+        'rule prepare',
+        f'  command = {__step_command("prepare")} && touch $stamp',
+        '  description = prepare $library',
+        '',
+        'rule build',
+        f'  command = {__step_command("build")}',
+        '  description = build $library ($target)',
+        '  pool = build',
+        '  restat = 1',
+        '',
+    ]
+
+    def add(rule: str, output: str, inputs: list[str], **variables: str) -> None:
+        lines.append(f'build {__escape_path(output)}: {rule} ' +
+                     ' '.join(__escape_path(i) for i in inputs))
+        lines.extend(f'  {name} = {__escape_command([value])}'
+                     for name, value in variables.items())
+
+    resolved = [(library, spec, libs.get(library), targets.create(spec))
+                for library, spec in nodes]
+
+    # the install manifests of all libraries, per install prefix
+    manifests = {(toolchain.install_prefix, project.name): project.get_manifest_path(toolchain)
+                 for _, _, project, toolchain in resolved}
+
+    downloads: set[str] = set()
+    prepared: dict[str, str] = {}
+    for library, spec, project, toolchain in resolved:
+        target = targets.get_id(spec)
+
+        if library not in prepared:
+            # sources are shared by all targets
+            tarball = os.path.join(toolchain.tarball_path, download_basename(project.url))
+            if tarball not in downloads:
+                downloads.add(tarball)
+                add('download', tarball, [],
+                    target=target, library=library, key=project.md5)
+
+            prepared[library] = os.path.join(path, 'stamps', library + '.prepared')
+            # $out is not quoted for the shell; $stamp is
+            add('prepare', prepared[library], [tarball],
+                target=target, library=library, key=project.get_source_key(),
+                stamp=prepared[library])
+
+        prefix = toolchain.install_prefix
+        inputs = [prepared[library]] + \
+            [manifests[(prefix, name)] for name in project.depends
+             if (prefix, name) in manifests]
+        # the dependencies are not installed yet, so their fingerprints
+        # are left out of the key; their manifests are inputs instead
+        add('build', manifests[(prefix, project.name)], inputs,
+            target=target, library=library,
+            key=project.fingerprint(toolchain, with_depends=False))
+
+    lines.append('')
+    lines.append('default ' + ' '.join(__escape_path(m) for m in manifests.values()))
+    return '\n'.join(lines) + '\n'
+
+def run(path: str, nodes: Sequence[Node]) -> None:
+    """Generate a build.ninja file for the given libraries in the given
+    directory and run ninja."""
+
+    ninja = shutil.which('ninja')
+    if ninja is None:
+        raise RuntimeError('ninja not found')
+
+    os.makedirs(os.path.join(path, 'stamps'), exist_ok=True)
+    targets.save(os.path.join(path, 'targets.json'), [spec for _, spec in nodes])
+    build_file = os.path.join(path, 'build.ninja')
+    write_if_changed(build_file, generate(path, nodes))
+
+    env = dict(os.environ)
+    js = jobserver.get()
+    if js is not None:
+        js.apply(env)
+    else:
+        # split the job limit among the concurrent build steps, like
+        # build-matrix.py does among its workers
+        env['MPD_BUILD_JOBS'] = str(max(1, jobs.get_default_jobs() // __build_jobs()))
+    # each step saves its spans there (see build/step.py)
+    spans_path = os.path.join(path, 'spans')
+    shutil.rmtree(spans_path, ignore_errors=True)
+
+    args = [ninja, '-f', build_file, '-j', str(jobs.get_default_jobs())]
+    try:
+        if js is not None and js.ninja_supported:
+            # ninja is a client; it needs the job it owns implicitly
+            with js.acquire():
+                subprocess.check_call(args, env=env)
+        else:
+            subprocess.check_call(args, env=env)
+    finally:
+        if os.path.isdir(spans_path):
+            for name in sorted(os.listdir(spans_path)):
+                trace.load_events(os.path.join(spans_path, name))
@@ -0,0 +1,342 @@
+import os
+import re
+import shlex
+import sys
+from typing import NoReturn, Optional, Sequence
+
+# the pkg-config version we claim to be compatible with
+PKG_CONFIG_VERSION = '0.29.2'
+
+_requires_re = re.compile(r'([^\s,<>=!]+)\s*(?:(<=|>=|!=|=|<|>)\s*([^\s,]+))?')
+_variable_re = re.compile(r'\$\{(\w+)\}')
+
+def compare_versions(a: str, b: str) -> int:
+    """Compare two version strings the way pkg-config does (rpmvercmp):
+    numeric segments are compared numerically, alphabetic segments
+    lexically, and numeric segments are newer than alphabetic ones."""
+
+    sa = re.findall(r'\d+|[a-zA-Z]+', a)
+    sb = re.findall(r'\d+|[a-zA-Z]+', b)
+    for x, y in zip(sa, sb):
+        if x.isdigit() and y.isdigit():
+            x_, y_ = int(x), int(y)
+            if x_ != y_:
+                return -1 if x_ < y_ else 1
+        elif x.isdigit() != y.isdigit():
+            return 1 if x.isdigit() else -1
+        elif x != y:
+            return -1 if x < y else 1
+    return (len(sa) > len(sb)) - (len(sa) < len(sb))
+
+def check_version(version: str, operator: Optional[str], wanted: Optional[str]) -> bool:
+    if operator is None or wanted is None:
+        return True
+    c = compare_versions(version, wanted)
+    return {
+        '<': c < 0, '<=': c <= 0, '=': c == 0,
+        '!=': c != 0, '>=': c >= 0, '>': c > 0,
+    }[operator]
+
+def parse_requires(value: str) -> list[tuple[str, Optional[str], Optional[str]]]:
+    """Parse a list of module names with optional version constraints,
+    e.g. "foo >= 1.0, bar"."""
+
+    return [(m.group(1), m.group(2), m.group(3))
+            for m in _requires_re.finditer(value)]
+
+class Package:
+    def __init__(self, name: str, path: str, defines: dict[str, str]):
+        self.name = name
+        self.variables: dict[str, str] = {'pcfiledir': os.path.dirname(path)}
+        self.fields: dict[str, str] = {}
+
+        with open(path) as f:
+            lines = f.read().replace('\\\n', ' ').splitlines()
+
+        for line in lines:
+            line = line.split('#', 1)[0].strip()
+            m = re.match(r'^([\w.]+)\s*([:=])\s*(.*)$', line)
+            if m is None:
+                continue
+            key, kind, value = m.groups()
+            if kind == '=':
+                if key in defines:
+                    value = defines[key]
+                self.variables[key] = self.expand(value)
+            else:
+                self.fields[key] = self.expand(value)
+
+    def expand(self, value: str) -> str:
+        return _variable_re.sub(lambda m: self.variables.get(m.group(1), ''), value)
+
+    @property
+    def version(self) -> str:
+        return self.fields.get('Version', '')
+
+    def get_requires(self, private: bool) -> list[tuple[str, Optional[str], Optional[str]]]:
+        key = 'Requires.private' if private else 'Requires'
+        return parse_requires(self.fields.get(key, ''))
+
+    def get_flags(self, key: str) -> list[str]:
+        return shlex.split(self.fields.get(key, ''))
+
+class NotFound(Exception):
+    pass
+
+class Resolver:
+    def __init__(self, search_path: Sequence[str], defines: dict[str, str]={}):
+        self.defines = defines
+        self.__packages: dict[str, Package] = {}
+
+        # index all .pc files of the search path; the first
+        # directory wins
+        self.__index: dict[str, str] = {}
+        for directory in search_path:
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                if name.endswith('.pc'):
+                    self.__index.setdefault(name[:-3], os.path.join(directory, name))
+
+    def get(self, name: str) -> Package:
+        package = self.__packages.get(name)
+        if package is None:
+            path = self.__index.get(name)
+            if path is None:
+                raise NotFound(f"Package {name} was not found in the pkg-config search path.\n"
+                               f"Perhaps you should add the directory containing `{name}.pc'\n"
+                               f"to the PKG_CONFIG_PATH environment variable")
+            package = self.__packages[name] = Package(name, path, self.defines)
+        return package
+
+    def resolve(self, name: str, operator: Optional[str], wanted: Optional[str]) -> Package:
+        package = self.get(name)
+        if not check_version(package.version, operator, wanted):
+            raise NotFound(f"Requested '{name} {operator} {wanted}' but version of"
+                           f" {package.fields.get('Name', name)} is {package.version}")
+        return package
+
+    def collect(self, packages: list[Package], private: bool) -> list[Package]:
+        """Return the given packages and all their (recursive)
+        requirements, each package after all packages requiring it."""
+
+        result: list[Package] = []
+        visiting: set[str] = set()
+
+        def visit(package: Package) -> None:
+            if package.name in visiting:
+                return
+            visiting.add(package.name)
+            requires = package.get_requires(False)
+            if private:
+                requires += package.get_requires(True)
+            for name, operator, wanted in reversed(requires):
+                visit(self.resolve(name, operator, wanted))
+            # pkg-config orders libraries so that each one precedes its
+            # dependencies
+            result.insert(0, package)
+
+        for package in reversed(packages):
+            visit(package)
+        return result
+
+def __dedup_first(flags: list[str]) -> list[str]:
+    result: list[str] = []
+    for flag in flags:
+        if flag not in result:
+            result.append(flag)
+    return result
+
+def __dedup_libs(flags: list[str]) -> list[str]:
+    # keep the first -L (search order) and the last -l (link order)
+    result: list[str] = []
+    for i, flag in enumerate(flags):
+        if flag.startswith('-l') and flag in flags[i + 1:]:
+            continue
+        if not flag.startswith('-l') and flag in result:
+            continue
+        result.append(flag)
+    return result
+
+def __get_cflags(resolver: Resolver, packages: list[Package]) -> list[str]:
+    flags: list[str] = []
+    # Requires.private contributes to Cflags even without --static
+    for package in resolver.collect(packages, True):
+        flags += package.get_flags('Cflags')
+    return __dedup_first(flags)
+
+def __get_libs(resolver: Resolver, packages: list[Package], static: bool) -> list[str]:
+    flags: list[str] = []
+    for package in resolver.collect(packages, static):
+        flags += package.get_flags('Libs')
+        if static:
+            flags += package.get_flags('Libs.private')
+    return __dedup_libs(flags)
+
+def __format(flags: list[str]) -> str:
+    return ' '.join(flag.replace(' ', '\\ ') for flag in flags)
+
+# options which only change the output of errors and other behavior we
+# do not implement
+IGNORED_OPTIONS = {
+    '--print-errors', '--short-errors', '--silence-errors',
+    '--errors-to-stdout', '--keep-system-cflags', '--keep-system-libs',
+    '--shared',
+}
+
+FLAG_OPTIONS = {
+    '--cflags': ('cflags', None),
+    '--cflags-only-I': ('cflags', lambda f: f.startswith('-I')),
+    '--cflags-only-other': ('cflags', lambda f: not f.startswith('-I')),
+    '--libs': ('libs', None),
+    '--libs-only-l': ('libs', lambda f: f.startswith('-l')),
+    '--libs-only-L': ('libs', lambda f: f.startswith('-L')),
+    '--libs-only-other': ('libs', lambda f: not f.startswith(('-l', '-L'))),
+}
+
+def get_libdir(root: str) -> list[str]:
+    """Return the PKG_CONFIG_LIBDIR for the given install prefix,
+    i.e. the default search path which replaces the one of the build
+    host."""
+
+    return [os.path.join(root, 'lib', 'pkgconfig'),
+            os.path.join(root, 'share', 'pkgconfig')]
+
+def get_search_path(root: str) -> list[str]:
+    """Return the .pc search path for the given install prefix; like
+    the real pkg-config, PKG_CONFIG_PATH is searched first."""
+
+    path = [p for p in os.environ.get('PKG_CONFIG_PATH', '').split(os.pathsep) if p]
+    return path + get_libdir(root)
+
+def find_real(own: Optional[str]=None) -> Optional[str]:
+    """Find the real pkg-config program of the build host (other than
+    the given one)."""
+
+    import shutil
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        program = shutil.which('pkg-config', path=directory)
+        if program is not None and os.path.realpath(program) != own:
+            return program
+    return None
+
+def __exec_real(root: str, args: Sequence[str]) -> NoReturn:
+    """Pass the query to the real pkg-config."""
+
+    program = find_real(os.path.realpath(sys.argv[0]))
+    if program is None:
+        print("pkg-config not found", file=sys.stderr)
+        sys.exit(1)
+
+    os.environ['PKG_CONFIG_LIBDIR'] = os.pathsep.join(get_libdir(root))
+    sys.stdout.flush()
+    os.execv(program, [program] + list(args))
+
+def main(args: Sequence[str], root: str) -> int:
+    modes: list[str] = []
+    static = False
+    exists = False
+    print_errors: Optional[bool] = None
+    variables: list[str] = []
+    defines: dict[str, str] = {}
+    version_check: Optional[tuple[str, str]] = None
+    names: list[str] = []
+
+    for arg in args:
+        option, _, value = arg.partition('=')
+        if not arg.startswith('--'):
+            names.append(arg)
+        elif arg == '--version':
+            print(PKG_CONFIG_VERSION)
+            return 0
+        elif option == '--atleast-pkgconfig-version':
+            return 0 if compare_versions(PKG_CONFIG_VERSION, value) >= 0 else 1
+        elif arg in FLAG_OPTIONS or arg == '--modversion':
+            modes.append(arg)
+        elif arg == '--static':
+            static = True
+        elif arg == '--exists':
+            exists = True
+        elif arg == '--print-errors':
+            print_errors = True
+        elif arg == '--silence-errors':
+            print_errors = False
+        elif arg in IGNORED_OPTIONS:
+            pass
+        elif option == '--variable' and value:
+            variables.append(value)
+        elif option == '--define-variable' and '=' in value:
+            name, _, define = value.partition('=')
+            defines[name] = define
+        elif option in ('--atleast-version', '--exact-version', '--max-version') and value:
+            version_check = ({'--atleast-version': '>=', '--exact-version': '=',
+                              '--max-version': '<='}[option], value)
+        else:
+            # not implemented here
+            return __exec_real(root, args)
+
+    resolver = Resolver(get_search_path(root), defines)
+    packages: list[Package] = []
+    try:
+        requires = parse_requires(' '.join(names))
+        if not requires:
+            print("Must specify package names on the command line", file=sys.stderr)
+            return 1
+        for name, operator, wanted in requires:
+            if version_check is not None:
+                operator, wanted = version_check
+            packages.append(resolver.resolve(name, operator, wanted))
+
+        output: list[str] = []
+        cflags: Optional[list[str]] = None
+        libs: Optional[list[str]] = None
+        for mode in modes:
+            if mode == '--modversion':
+                for package in packages:
+                    print(package.version)
+                continue
+
+            kind, predicate = FLAG_OPTIONS[mode]
+            if kind == 'cflags':
+                if cflags is None:
+                    cflags = __get_cflags(resolver, packages)
+                flags = cflags
+            else:
+                if libs is None:
+                    libs = __get_libs(resolver, packages, static)
+                flags = libs
+            output += [f for f in flags if predicate is None or predicate(f)]
+
+        for variable in variables:
+            print(' '.join(package.variables.get(variable, '') for package in packages))
+
+        if any(mode in FLAG_OPTIONS for mode in modes):
+            print(__format(output))
+    except NotFound as e:
+        if print_errors or (print_errors is None and not exists):
+            print(e, file=sys.stderr)
+        return 1
+
+    return 0
+
+BUILTIN_WRAPPER = '''#!{python} -IS
+# generated by MPD's build scripts; see build/pkgconfig.py
+import sys
+sys.path.insert(0, {python_path!r})
+from build.pkgconfig import main
+sys.exit(main(sys.argv[1:], {root!r}))
+'''
+
+def get_wrapper(root: str) -> str:
+    """Return the contents of the bin/pkg-config script which the
+    toolchain installs into the given install prefix if there is no
+    real pkg-config (see toolchain.install_pkg_config()).  It runs
+    main(), which searches the prefix instead of the default search
+    path of the build host; the .pc files are indexed once per
+    query."""
+
+    return BUILTIN_WRAPPER.format(python=sys.executable,
+                                  python_path=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  root=root)
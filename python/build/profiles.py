@@ -0,0 +1,67 @@
+from typing import Collection, Optional
+
+class Profile:
+    """A named set of compiler settings for all projects built with a
+    toolchain.  Projects may add configure arguments for the features
+    of a profile (see Project.profile_args)."""
+
+    def __init__(self, name: str, optimize: str,
+                 features: Collection[str],
+                 lto: bool=False,
+                 march: Optional[str]=None,
+                 pgo_generate: bool=False):
+        self.name = name
+        self.optimize = optimize
+        self.features = features
+        self.lto = lto
+        self.march = march
+        self.pgo_generate = pgo_generate
+
+    def get_cflags(self, host_triplet: str, clang: bool) -> str:
+        flags = [self.optimize, '-g']
+        if self.march is not None:
+            if not host_triplet.startswith('x86_64'):
+                raise RuntimeError(f'Build profile {self.name} is not supported on {host_triplet}')
+            flags.append('-march=' + self.march)
+        if self.lto:
+            # ThinLTO with clang; gcc uses one LTRANS job per CPU
+            flags.append('-flto=thin' if clang else '-flto=auto')
+        if self.pgo_generate:
+            flags.append('-fprofile-generate')
+        return ' '.join(flags)
+
+    def get_ldflags(self, host_triplet: str, clang: bool) -> str:
+        """Return the flags which need to be passed to the linker, too;
+        with LTO, the code is generated at link time."""
+
+        if self.lto or self.pgo_generate:
+            return self.get_cflags(host_triplet, clang)
+        return ''
+
+PROFILES = {p.name: p for p in (
+    Profile('size', '-Os', ('size',)),
+    Profile('speed', '-O2', ('speed',)),
+    Profile('speed-lto', '-O2', ('speed', 'lto'), lto=True),
+    Profile('native-x86-64-v3', '-O2', ('speed',), march='x86-64-v3'),
+    Profile('pgo-generate', '-O2', ('speed', 'pgo'), pgo_generate=True),
+)}
+
+def get(name: Optional[str]) -> Optional[Profile]:
+    """Look up a profile by name; None selects the toolchain's default
+    settings and returns None."""
+
+    if name is None:
+        return None
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise RuntimeError('Unknown build profile: ' + name)
+
+def get_dir_name(base: str, name: Optional[str]) -> str:
+    """Return the name of a directory (e.g. "root" or "build") for the
+    given profile; each profile has its own install prefix and build
+    directories."""
+
+    if name is None:
+        return base
+    return f'{base}-{name}'
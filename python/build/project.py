@@ -1,32 +1,81 @@
 import os, shutil
+import copy
+import functools
+import hashlib
+import json
 import re
-from typing import cast, BinaryIO, Optional, Sequence, Union
+from contextlib import contextmanager
+from typing import cast, Any, BinaryIO, Iterator, Mapping, Optional, Sequence, Union
 
+from build import artifacts
 from build.download import download_basename, download_and_verify
 from build.tar import untar
+from build import srccache
+from build import ccache, incremental, jobs, profiles, trace
 from build.quilt import push_all
+from .fsutil import move_tree, scan_tree, write_atomic
+from .lock import file_lock
 from .toolchain import AnyToolchain
 
+# source trees which have already been unpacked by this process
+_unpacked: set[str] = set()
+
+# toolchain attributes which affect the build result; the compilers
+# are hashed without the compiler cache launcher, which does not
+TOOLCHAIN_FINGERPRINT_ATTRIBUTES = (
+    'host_triplet',
+    'real_cc', 'real_cxx', 'cflags', 'cxxflags', 'cppflags', 'ldflags', 'libs',
+    'ar', 'arflags', 'ranlib', 'nm', 'strip', 'windres',
+    'profile',
+)
+
+# a file inside prepared source trees containing the source key
+SOURCE_KEY_FILE = '.mpd-source-key'
+
+# the directory (inside the install prefix) containing the manifests
+# of all installed projects
+MANIFEST_DIR = '.manifests'
+
+@functools.cache
+def get_tarball_base(url: Union[str, Sequence[str]]) -> str:
+    """Return the tarball name without the file extension."""
+
+    basename = download_basename(url)
+    m = re.match(r'^(.+)\.(tar(\.(gz|bz2|xz|lzma))?|zip)$', basename)
+    if not m: raise RuntimeError('Could not identify tarball name: ' + basename)
+    return m.group(1)
+
+@functools.cache
+def parse_base(base: str) -> tuple[str, str]:
+    """Split a tarball base name into project name and version."""
+
+    m = re.match(r'^([-\w]+)-(\d[\d.]*[a-z]?[\d.]*(?:-(?:alpha|beta)\d+)?)(\+.*)?$', base)
+    if not m: raise RuntimeError('Could not identify tarball name: ' + base)
+    return m.group(1), m.group(2)
+
+def _read_manifest(path: str) -> Optional[dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return cast(dict[str, Any], json.load(f))
+    except (FileNotFoundError, ValueError):
+        return None
+
 class Project:
     def __init__(self, url: Union[str, Sequence[str]], md5: str, installed: str,
                  name: Optional[str]=None, version: Optional[str]=None,
                  base: Optional[str]=None,
                  patches: Optional[str]=None,
                  edits=None,
-                 use_cxx: bool=False):
-        if base is None:
-            basename = download_basename(url)
-            m = re.match(r'^(.+)\.(tar(\.(gz|bz2|xz|lzma))?|zip)$', basename)
-            if not m: raise RuntimeError('Could not identify tarball name: ' + basename)
-            self.base = m.group(1)
-        else:
-            self.base = base
+                 use_cxx: bool=False,
+                 depends: Sequence[str]=(),
+                 profile_args: Optional[Mapping[str, Sequence[str]]]=None,
+                 memory_per_job: int=jobs.DEFAULT_MEMORY_PER_JOB // 2**20):
+        self.base = base if base is not None else get_tarball_base(url)
 
         if name is None or version is None:
-            m = re.match(r'^([-\w]+)-(\d[\d.]*[a-z]?[\d.]*(?:-(?:alpha|beta)\d+)?)(\+.*)?$', self.base)
-            if not m: raise RuntimeError('Could not identify tarball name: ' + self.base)
-            if name is None: name = m.group(1)
-            if version is None: version = m.group(2)
+            parsed_name, parsed_version = parse_base(self.base)
+            if name is None: name = parsed_name
+            if version is None: version = parsed_version
 
         self.name = name
         self.version = version
@@ -41,29 +90,203 @@ class Project:
         self.patches = patches
         self.edits = edits
         self.use_cxx = use_cxx
+        self.depends = depends
+
+        # additional configure arguments per build profile feature
+        # (see build/profiles.py)
+        self.profile_args = profile_args
+
+        # estimated peak memory of one compiler process [MiB]; this
+        # limits the number of parallel jobs on machines with little
+        # memory
+        self.memory_per_job = memory_per_job * 2**20
+
+        # the state of the current build, per install prefix
+        self.__installed_files: dict[str, set[str]] = {}
+        self.__keys: dict[str, str] = {}
+        self.__build_paths: dict[str, str] = {}
+
+    def __get_edits_inputs(self) -> list[str]:
+        inputs = []
+        if self.edits is not None:
+            for filename, function in sorted(self.edits.items()):
+                code = function.__code__
+                inputs.append(f'{filename}={code.co_code.hex()}{code.co_consts!r}')
+        return inputs
+
+    def get_fingerprint_inputs(self, toolchain: AnyToolchain) -> list[str]:
+        """Return all configuration which affects the build result.
+        Subclasses which have additional settings must extend this.
+        Occurrences of the install prefix are replaced with a
+        placeholder, so the result does not depend on the location of
+        the build."""
+
+        inputs = [type(self).__name__, self.base, self.md5] + self.__get_edits_inputs()
+        inputs.append(f'profile_args={self.get_profile_args(toolchain)!r}')
+
+        for attribute in TOOLCHAIN_FINGERPRINT_ATTRIBUTES:
+            inputs.append(f'{attribute}={getattr(toolchain, attribute, None)}')
+
+        prefix = toolchain.install_prefix
+        return [x.replace(prefix, '@PREFIX@') for x in inputs]
+
+    def get_profile_args(self, toolchain: AnyToolchain) -> list[str]:
+        """Return the configure arguments for the build profile of the
+        given toolchain."""
+
+        profile = profiles.get(getattr(toolchain, 'profile', None))
+        if profile is None or self.profile_args is None:
+            return []
+        return [arg for feature in profile.features
+                for arg in self.profile_args.get(feature, ())]
+
+    def get_patches_digest(self) -> Optional[str]:
+        if self.patches is None:
+            return None
+
+        h = hashlib.sha256()
+        for dirpath, dirnames, filenames in sorted(os.walk(self.patches)):
+            for name in sorted(filenames):
+                full = os.path.join(dirpath, name)
+                h.update(os.path.relpath(full, self.patches).encode() + b'\0')
+                with open(full, 'rb') as f:
+                    h.update(f.read())
+        return h.hexdigest()
+
+    def fingerprint(self, toolchain: AnyToolchain, with_depends: bool=True) -> str:
+        """Calculate a hash of all inputs of this project's build.  This
+        includes the fingerprints of the installed dependencies (from
+        their manifests), so the project is rebuilt when one of them
+        changes."""
+
+        h = hashlib.sha256()
+        for x in self.get_fingerprint_inputs(toolchain):
+            h.update(x.encode() + b'\0')
+        h.update(str(self.get_patches_digest()).encode())
+        if with_depends:
+            for name in self.depends:
+                path = os.path.join(toolchain.install_prefix, MANIFEST_DIR, name + '.json')
+                manifest = _read_manifest(path)
+                fingerprint = manifest['fingerprint'] if manifest is not None else None
+                h.update(f'\0depends={name}:{fingerprint}'.encode())
+        return h.hexdigest()
+
+    def get_source_key(self) -> str:
+        """Calculate a hash identifying the prepared source tree, i.e.
+        the tarball plus patches and edits."""
+
+        h = hashlib.sha256()
+        for x in [self.base, self.md5, str(self.get_patches_digest())] + self.__get_edits_inputs():
+            h.update(x.encode() + b'\0')
+        return h.hexdigest()
 
     def download(self, toolchain: AnyToolchain) -> str:
-        return download_and_verify(self.url, self.md5, toolchain.tarball_path)
+        with trace.span('download'):
+            return download_and_verify(self.url, self.md5, toolchain.tarball_path)
+
+    def get_manifest_path(self, toolchain: AnyToolchain) -> str:
+        return os.path.join(toolchain.install_prefix, MANIFEST_DIR, self.name + '.json')
+
+    def load_manifest(self, toolchain: AnyToolchain) -> Optional[dict[str, Any]]:
+        """Load the manifest written by the last build of this project,
+        or return None if there is none."""
+
+        return _read_manifest(self.get_manifest_path(toolchain))
+
+    def __write_manifest(self, toolchain: AnyToolchain, fingerprint: str,
+                         files: list[str]) -> None:
+        path = self.get_manifest_path(toolchain)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, json.dumps({
+            'name': self.name,
+            'version': self.version,
+            'fingerprint': fingerprint,
+            'files': sorted(files),
+        }, indent=1))
+
+    def __uninstall(self, toolchain: AnyToolchain) -> None:
+        """Delete the files installed by the previous build of this
+        project (according to its manifest)."""
+
+        manifest = self.load_manifest(toolchain)
+        if manifest is None:
+            return
+
+        for name in manifest['files']:
+            try:
+                os.unlink(os.path.join(toolchain.install_prefix, name))
+            except FileNotFoundError:
+                pass
+        os.unlink(self.get_manifest_path(toolchain))
 
     def is_installed(self, toolchain: AnyToolchain) -> bool:
-        tarball = self.download(toolchain)
-        installed = os.path.join(toolchain.install_prefix, self.installed)
-        tarball_mtime = os.path.getmtime(tarball)
-        try:
-            return os.path.getmtime(installed) >= tarball_mtime
-        except FileNotFoundError:
+        """Check whether this project is installed with the current
+        configuration, i.e. the fingerprint in its manifest is still
+        the same."""
+
+        manifest = self.load_manifest(toolchain)
+        if manifest is None or manifest['fingerprint'] != self.fingerprint(toolchain):
             return False
+        return os.path.exists(os.path.join(toolchain.install_prefix, self.installed))
+
+    def prepare(self, toolchain: AnyToolchain) -> None:
+        """Download and prepare the sources, so the build does not need
+        to.  Projects which are not built from the shared source tree
+        (see unpack()) only download the tarball."""
+
+        self.unpack(toolchain)
 
     def unpack(self, toolchain: AnyToolchain, out_of_tree: bool=True) -> str:
         if out_of_tree:
             parent_path = toolchain.src_path
         else:
             parent_path = toolchain.build_path
-        path = untar(self.download(toolchain), parent_path, self.base,
-                     lazy=out_of_tree and self.patches is None)
+        path = os.path.join(parent_path, self.base)
+
+        # source trees may be shared by several concurrent builds
+        # (e.g. one per Android ABI); unpack each of them only once
+        with trace.span('unpack'), file_lock(path + '.lock'):
+            if path not in _unpacked:
+                self.__unpack_to(toolchain, path, out_of_tree)
+                _unpacked.add(path)
+
+        return path
+
+    def __unpack_to(self, toolchain: AnyToolchain, path: str, out_of_tree: bool) -> None:
+        parent_path = os.path.dirname(path)
+
+        if out_of_tree and self.patches is None:
+            # pristine sources can be reused
+            untar(self.download(toolchain), parent_path, self.base, lazy=True)
+            self.__apply_edits(path)
+            return
+
+        key = self.get_source_key()
+        key_path = os.path.join(path, SOURCE_KEY_FILE)
+        if out_of_tree:
+            try:
+                with open(key_path) as f:
+                    if f.read() == key:
+                        # already prepared by an earlier run or by
+                        # another process
+                        return
+            except FileNotFoundError:
+                pass
+
+        # copy the patched tree from the source cache (cheap with
+        # reflinks) instead of extracting and patching it again
+        srccache.checkout(key, self.base, path,
+                          lambda parent: self.__prepare_source(toolchain, parent))
+        with open(key_path, 'w') as f:
+            f.write(key)
+
+    def __prepare_source(self, toolchain: AnyToolchain, parent_path: str) -> None:
+        path = untar(self.download(toolchain), parent_path, self.base)
         if self.patches is not None:
             push_all(toolchain, path, self.patches)
+        self.__apply_edits(path)
 
+    def __apply_edits(self, path: str) -> None:
         if self.edits is not None:
             for filename, function in self.edits.items():
                 with open(os.path.join(path, filename), 'r+t') as f:
@@ -73,8 +296,6 @@ class Project:
                     f.truncate(0)
                     f.write(new_data)
 
-        return path
-
     def make_build_path(self, toolchain: AnyToolchain, lazy: bool=False) -> str:
         path = os.path.join(toolchain.build_path, self.base)
         if lazy and os.path.isdir(path):
@@ -86,5 +307,149 @@ class Project:
         os.makedirs(path, exist_ok=True)
         return path
 
+    def __get_configure_inputs(self, toolchain: AnyToolchain) -> list[str]:
+        return [toolchain.install_prefix] + self.get_fingerprint_inputs(toolchain)
+
+    def get_configured_build_path(self, toolchain: AnyToolchain) -> Optional[str]:
+        """Return the build directory if it has been configured with the
+        current settings by an earlier build; the build system will
+        then only rebuild what has changed (e.g. after editing a
+        patch).  Returns None if configure needs to be run in a new
+        build directory (see make_build_path())."""
+
+        path = os.path.join(toolchain.build_path, self.base)
+        if incremental.is_configured(path, self.__get_configure_inputs(toolchain)):
+            return path
+        return None
+
+    def mark_configured(self, toolchain: AnyToolchain, build: str) -> None:
+        incremental.mark_configured(build, self.__get_configure_inputs(toolchain))
+
+    @contextmanager
+    def installing(self, toolchain: AnyToolchain) -> Iterator[str]:
+        """Wrap the install step of a build.  This serializes all
+        installs into the same prefix and records which files were
+        installed (for the artifact cache).
+
+        The install step shall install into the DESTDIR staging
+        directory returned by this method; its contents are then moved
+        into the prefix, which records even files which the build
+        system considered up-to-date.  Files installed directly into
+        the prefix are recorded if they were changed."""
+
+        prefix = toolchain.install_prefix
+        destdir = prefix + '.destdir'
+        with file_lock(prefix + '.lock'), trace.span('install'):
+            shutil.rmtree(destdir, ignore_errors=True)
+            before = scan_tree(prefix)
+            yield destdir
+            after = scan_tree(prefix)
+
+            staged = os.path.join(destdir, os.path.relpath(prefix, os.sep))
+            moved = move_tree(staged, prefix) if os.path.isdir(staged) else []
+            shutil.rmtree(destdir, ignore_errors=True)
+
+        files = self.__installed_files.setdefault(prefix, set())
+        files.update(name for name, st in after.items() if before.get(name) != st)
+        files.update(moved)
+
+    def configure(self, toolchain: AnyToolchain) -> str:
+        """The first phase of a build: prepare a build directory and
+        return its path."""
+
+        raise NotImplementedError
+
+    def compile(self, toolchain: AnyToolchain, build: str) -> None:
+        """The second phase of a build: compile in the given build
+        directory.  This is the only phase which runs parallel jobs."""
+
+        raise NotImplementedError
+
+    def install(self, toolchain: AnyToolchain, build: str, destdir: str) -> None:
+        """The last phase of a build: install into the install prefix
+        below the given DESTDIR.  This is called inside installing()."""
+
+        raise NotImplementedError
+
+    def _build(self, toolchain: AnyToolchain) -> None:
+        """Build and install the project.  Subclasses implement either
+        configure(), compile() and install(), which can be scheduled
+        separately (see has_phases()), or only this method."""
+
+        build = self.configure(toolchain)
+        with trace.span('compile'):
+            self.compile(toolchain, build)
+        with self.installing(toolchain) as destdir:
+            self.install(toolchain, build, destdir)
+
+    def has_phases(self) -> bool:
+        return type(self)._build is Project._build
+
+    def is_jobserver_client(self) -> bool:
+        """Does the compile phase take its job tokens from the jobserver
+        (if there is one)?  Otherwise, the Scheduler has to reserve
+        jobs for it."""
+
+        return True
+
+    def run_configure(self, toolchain: AnyToolchain) -> bool:
+        """Start a build: uninstall the previous build, then restore
+        the project from the artifact cache or configure it.  Returns
+        False if it has been restored, i.e. run_compile() and
+        run_install() must not be called."""
+
+        prefix = toolchain.install_prefix
+        key = self.fingerprint(toolchain)
+
+        with trace.span('build', project=self.name):
+            with file_lock(prefix + '.lock'), trace.span('restore'):
+                self.__uninstall(toolchain)
+
+                files = artifacts.restore(key, prefix)
+                if files is not None:
+                    print(f"restored {self.name} from the artifact cache")
+                    self.__write_manifest(toolchain, key, files)
+                    return False
+
+            self.__installed_files[prefix] = set()
+            self.__keys[prefix] = key
+            if self.has_phases():
+                self.__build_paths[prefix] = self.configure(toolchain)
+            return True
+
+    def run_compile(self, toolchain: AnyToolchain) -> None:
+        prefix = toolchain.install_prefix
+        with trace.span('build', project=self.name), \
+             ccache.record(self.name, toolchain.env) as env:
+            # compile with the environment which records this
+            # project's compiler cache statistics
+            toolchain = copy.copy(toolchain)
+            toolchain.env = env
+            if self.has_phases():
+                with trace.span('compile'):
+                    self.compile(toolchain, self.__build_paths[prefix])
+            else:
+                self._build(toolchain)
+
+    def run_install(self, toolchain: AnyToolchain) -> None:
+        """Finish a build: install and store the installed files in the
+        artifact cache."""
+
+        prefix = toolchain.install_prefix
+        with trace.span('build', project=self.name):
+            if self.has_phases():
+                with self.installing(toolchain) as destdir:
+                    self.install(toolchain, self.__build_paths.pop(prefix), destdir)
+
+            key = self.__keys.pop(prefix)
+            files = sorted(self.__installed_files.pop(prefix))
+            with trace.span('store'):
+                artifacts.store(key, prefix, files)
+
+            with file_lock(prefix + '.lock'):
+                self.__write_manifest(toolchain, key, files)
+
     def build(self, toolchain: AnyToolchain) -> None:
-        self._build(toolchain)
+        if self.run_configure(toolchain):
+            self.run_compile(toolchain)
+            self.run_install(toolchain)
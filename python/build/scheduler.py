@@ -0,0 +1,186 @@
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import nullcontext
+from typing import Optional
+
+from build.project import Project
+from build import jobs, jobserver
+from .toolchain import AnyToolchain
+
+NodeKey = tuple[str, str]
+
+# the phases of each project build (see Project.run_configure() etc.)
+PHASES = ('configure', 'compile', 'install')
+
+TaskKey = tuple[NodeKey, str]
+
+class Scheduler:
+    """Build a set of projects as a dependency graph.
+
+    Each project is built in three phases (configure, compile,
+    install), which are scheduled separately: configure scripts are
+    mostly single-threaded, so several of them run while another
+    project compiles with the remaining jobs.  The configure phase
+    needs the dependencies to be installed.  Installs into the same
+    prefix are serialized by Project.installing().
+
+    Projects which do not depend on each other are built concurrently,
+    and all of them share one budget of parallel jobs.  Dependencies
+    (see Project.depends) are only honored between projects which are
+    installed into the same prefix; dependencies which are not part of
+    the graph are ignored.
+
+    This uses threads, not processes: the actual work is done by
+    child processes (configure, make, ninja), and threads avoid having
+    to pickle projects and toolchains.
+    """
+
+    def __init__(self, jobs: Optional[int]=None):
+        self.jobs = jobs
+        self.__nodes: dict[NodeKey, tuple[Project, AnyToolchain]] = {}
+
+    def add(self, project: Project, toolchain: AnyToolchain) -> None:
+        self.__nodes[(toolchain.install_prefix, project.name)] = (project, toolchain)
+
+    def __get_dependencies(self, task: TaskKey) -> list[TaskKey]:
+        key, phase = task
+        if phase != 'configure':
+            return [(key, PHASES[PHASES.index(phase) - 1])]
+
+        prefix = key[0]
+        project = self.__nodes[key][0]
+        return [((prefix, name), 'install') for name in project.depends
+                if (prefix, name) in self.__nodes]
+
+    def __is_jobserver_client(self, task: TaskKey) -> bool:
+        return jobserver.get() is not None and \
+            self.__nodes[task[0]][0].is_jobserver_client()
+
+    @staticmethod
+    def __run(project: Project, toolchain: AnyToolchain, phase: str,
+              n_jobs: int, n_tokens: int) -> bool:
+        """Run one phase of a project build; returns False if the
+        remaining phases shall be skipped.
+
+        With a jobserver, this holds up to n_tokens job tokens while it
+        runs, so all builds sharing the jobserver (e.g. the workers of
+        build-matrix.py) obey its limit.
+        """
+
+        js = jobserver.get()
+        with js.acquire(n_tokens) if js is not None else nullcontext(n_tokens) as n_acquired:
+            if n_tokens > 1:
+                # a share of the budget, reduced to the tokens obtained
+                n_jobs = n_acquired
+
+            with jobs.limit(n_jobs):
+                if phase == 'configure':
+                    return not project.is_installed(toolchain) and \
+                        project.run_configure(toolchain)
+                elif phase == 'compile':
+                    project.run_compile(toolchain)
+                else:
+                    project.run_install(toolchain)
+                return True
+
+    def run(self) -> None:
+        budget = self.jobs
+        if budget is None:
+            budget = jobs.get_default_jobs()
+
+        pending = [(key, phase) for key in self.__nodes for phase in PHASES]
+        dependencies = {task: self.__get_dependencies(task) for task in pending}
+        done: set[TaskKey] = set()
+        running: dict[Future[bool], tuple[TaskKey, int]] = {}
+        js = jobserver.get()
+        if js is not None:
+            # the jobserver limits the total number of jobs
+            budget = js.jobs
+            for project, toolchain in self.__nodes.values():
+                js.apply(toolchain.env)
+
+        available = budget
+
+        # compiles which are charged a share of the budget (see below)
+        # leave some jobs for configure and install, so those are not
+        # starved while big projects compile
+        reserve = budget // 4
+        sharing: set[TaskKey] = set()
+
+        error: Optional[BaseException] = None
+
+        with ThreadPoolExecutor(max_workers=budget) as executor:
+            while running or (pending and error is None):
+                if error is None:
+                    ready = [task for task in pending
+                             if all(d in done for d in dependencies[task])]
+
+                    # configure and install are (mostly) single
+                    # threaded, so they are started first; compiles
+                    # share the remaining budget
+                    ready.sort(key=lambda task: task[1] == 'compile')
+                    n_compiles = sum(1 for task in ready if task[1] == 'compile' and
+                                     not self.__is_jobserver_client(task))
+
+                    for task in ready:
+                        if available <= 0:
+                            break
+
+                        if task[1] != 'compile':
+                            cost = n_jobs = n_tokens = 1
+                        elif self.__is_jobserver_client(task):
+                            # each project occupies the one job which
+                            # every jobserver client owns implicitly
+                            # (see Jobserver.acquire()); it gets more
+                            # tokens from the jobserver
+                            cost, n_jobs, n_tokens = 1, budget, 1
+                        else:
+                            # without a jobserver (or if the build tool
+                            # is not a client, e.g. old ninja), split
+                            # the remaining budget among all projects
+                            # which are ready to be compiled; the
+                            # number of jobs is fixed once make/ninja
+                            # runs, so a project which starts late
+                            # gets at least its fair share
+                            free = available - reserve
+                            fair = budget // (len(sharing) + n_compiles)
+                            n_jobs = max(free // n_compiles, fair)
+                            n_compiles -= 1
+                            if free <= 0 and sharing:
+                                # wait for a running compile to finish
+                                continue
+
+                            cost = n_jobs = n_tokens = max(1, min(n_jobs, budget - reserve))
+                            sharing.add(task)
+                        pending.remove(task)
+                        available -= cost
+                        project, toolchain = self.__nodes[task[0]]
+                        future = executor.submit(self.__run, project, toolchain,
+                                                 task[1], n_jobs, n_tokens)
+                        running[future] = (task, cost)
+
+                    if not running:
+                        raise RuntimeError('Dependency cycle: ' +
+                                           ', '.join(sorted(set(key[1] for key, _ in pending))))
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task, cost = running.pop(future)
+                    available += cost
+                    sharing.discard(task)
+                    e = future.exception()
+                    if e is not None:
+                        # stop scheduling new tasks, but let the
+                        # running ones finish
+                        if error is None:
+                            error = e
+                    else:
+                        done.add(task)
+                        if not future.result():
+                            # already installed or restored from the
+                            # artifact cache
+                            for phase in PHASES[1:]:
+                                pending.remove((task[0], phase))
+                                done.add((task[0], phase))
+
+        if error is not None:
+            raise error
@@ -0,0 +1,40 @@
+import os, shutil, subprocess
+from typing import Callable
+
+from .dirs import cache_path
+from .lock import file_lock
+
+def clone_tree(src: str, dst: str) -> None:
+    """Copy a directory tree, sharing the file contents (copy-on-write)
+    if the file system supports reflinks."""
+
+    try:
+        subprocess.check_call(['cp', '-a', '--reflink=auto', src, dst])
+    except (FileNotFoundError, subprocess.CalledProcessError):
+        # not GNU coreutils
+        shutil.rmtree(dst, ignore_errors=True)
+        shutil.copytree(src, dst, symlinks=True)
+
+def checkout(key: str, base: str, path: str,
+             populate: Callable[[str], None]) -> None:
+    """Create a fresh copy of a prepared (i.e. unpacked and patched)
+    source tree at the given path.  The tree is taken from the source
+    cache; if it is not there yet, populate() is called with a
+    temporary parent directory in which it shall create the directory
+    "base"."""
+
+    cached = os.path.join(cache_path, 'src', key)
+    with file_lock(cached + '.lock'):
+        if not os.path.isdir(cached):
+            tmp = f'{cached}.{os.getpid()}.tmp'
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+            populate(tmp)
+            os.rename(tmp, cached)
+
+    try:
+        shutil.rmtree(path)
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    clone_tree(os.path.join(cached, base), path)
@@ -0,0 +1,61 @@
+"""Run one step of a third-party project build; this is invoked by the
+build.ninja file generated by build/ninjafile.py:
+
+  python -m build.step STEP TARGETS_FILE TARGET LIBRARY [KEY]
+
+STEP is one of "download", "prepare" and "build".  LIBRARY is the
+name of a library in build/libs.py; TARGET selects its toolchain from
+TARGETS_FILE (see build/targets.py).  KEY is ignored; it is only part
+of the command line so ninja runs the step again when it changes.
+"""
+
+import os
+import sys
+from typing import Sequence
+
+from build import jobs, jobserver, libs, targets, trace
+
+STEPS = ('download', 'prepare', 'build')
+
+def main(args: Sequence[str]) -> int:
+    if len(args) < 4 or args[0] not in STEPS:
+        print(__doc__, file=sys.stderr)
+        return 1
+
+    step, targets_file, target, library = args[:4]
+    try:
+        __run(step, targets_file, target, library)
+    finally:
+        # the spans of this step, for the build reports (see
+        # ninjafile.run())
+        trace.save_events(os.path.join(os.path.dirname(targets_file), 'spans',
+                                       f'{step}-{library}-{target}.json'))
+    return 0
+
+def __run(step: str, targets_file: str, target: str, library: str) -> None:
+    toolchain = targets.load(targets_file, target)
+    project = libs.get(library)
+
+    if step == 'download':
+        project.download(toolchain)
+    elif step == 'prepare':
+        project.prepare(toolchain)
+    else:
+        js = jobserver.start(jobs.get_default_jobs())
+        if js is not None:
+            js.apply(toolchain.env)
+
+        # this writes the install manifest (the output of this step)
+        # only if something was built; ninja's "restat" will then skip
+        # the projects depending on this one
+        if not project.is_installed(toolchain):
+            if js is not None and not js.ninja_supported:
+                # ninja is not a jobserver client and did not take a
+                # token for this step
+                with js.acquire():
+                    project.build(toolchain)
+            else:
+                project.build(toolchain)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
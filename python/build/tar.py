@@ -1,4 +1,97 @@
 import os, shutil, subprocess
+import tarfile
+import time
+from typing import Any, Optional
+
+# external decompressors by file name suffix, in order of preference;
+# the multi-threaded ones come first (note that "xz -T0" can only
+# parallelize archives which consist of more than one block)
+DECOMPRESSORS = {
+    '.xz': (('xz', '-T0', '-dc'),),
+    '.lzma': (('xz', '-dc'),),
+    '.zst': (('zstd', '-T0', '-dc'),),
+    '.gz': (('pigz', '-dc'), ('gzip', '-dc')),
+    '.tgz': (('pigz', '-dc'), ('gzip', '-dc')),
+    '.bz2': (('lbzip2', '-dc'), ('pbzip2', '-dc'), ('bzip2', '-dc')),
+}
+
+def __find_decompressor(tarball_path: str) -> Optional[list[str]]:
+    suffix = os.path.splitext(tarball_path)[1]
+    for command in DECOMPRESSORS.get(suffix, ()):
+        program = shutil.which(command[0])
+        if program is not None:
+            return [program] + list(command[1:])
+    return None
+
+def __extract_members(tar: tarfile.TarFile, parent_path: str) -> int:
+    """Extract all members of a tar stream (in the order they appear)
+    and return the total number of bytes.
+
+    Like TarFile.extractall(), the mode and time stamp of directories
+    are applied last, so read-only directories can be populated."""
+
+    kwargs: dict[str, Any] = {}
+    if hasattr(tarfile, 'tar_filter'):
+        kwargs['filter'] = 'tar'
+
+    size = 0
+    directories = []
+    for member in tar:
+        if member.isdir():
+            if 'filter' in kwargs:
+                member = tarfile.tar_filter(member, parent_path)
+            tar.extract(member, parent_path, set_attrs=False, **kwargs)
+            directories.append(member)
+        else:
+            tar.extract(member, parent_path, **kwargs)
+        size += member.size
+
+    # innermost directories first
+    directories.sort(key=lambda member: member.name, reverse=True)
+    for member in directories:
+        path = os.path.join(parent_path, member.name)
+        if member.mode is not None:
+            os.chmod(path, member.mode)
+        if member.mtime is not None:
+            os.utime(path, (member.mtime, member.mtime))
+    return size
+
+def __extract_tar(tarball_path: str, parent_path: str) -> int:
+    decompressor = __find_decompressor(tarball_path)
+    if decompressor is None:
+        # decompress in this process
+        with tarfile.open(tarball_path, 'r|*') as tar:
+            return __extract_members(tar, parent_path)
+
+    with subprocess.Popen(decompressor + [tarball_path],
+                          stdout=subprocess.PIPE) as p:
+        assert(p.stdout is not None)
+        with tarfile.open(fileobj=p.stdout, mode='r|') as tar:
+            size = __extract_members(tar, parent_path)
+
+        # consume trailing padding
+        while p.stdout.read(65536):
+            pass
+
+    if p.returncode != 0:
+        raise subprocess.CalledProcessError(p.returncode, decompressor)
+    return size
+
+def __extract_zip(tarball_path: str, parent_path: str) -> int:
+    import zipfile
+    with zipfile.ZipFile(tarball_path) as z:
+        z.extractall(parent_path)
+        return sum(i.file_size for i in z.infolist())
+
+def extract(tarball_path: str, parent_path: str) -> int:
+    """Extract an archive into the given directory and return the
+    number of uncompressed bytes.  Members are streamed to disk while
+    an external (multi-threaded, if available) decompressor runs in
+    parallel."""
+
+    if tarball_path.endswith('.zip'):
+        return __extract_zip(tarball_path, parent_path)
+    return __extract_tar(tarball_path, parent_path)
 
 def untar(tarball_path: str, parent_path: str, base: str,
           lazy: bool=False) -> str:
@@ -10,11 +103,12 @@ def untar(tarball_path: str, parent_path: str, base: str,
     except FileNotFoundError:
         pass
     os.makedirs(parent_path, exist_ok=True)
-    try:
-        subprocess.check_call(['tar', 'xfC', tarball_path, parent_path])
-    except FileNotFoundError:
-        import tarfile
-        tar = tarfile.open(tarball_path)
-        tar.extractall(path=parent_path)
-        tar.close()
+
+    start = time.monotonic()
+    size = extract(tarball_path, parent_path)
+    duration = max(time.monotonic() - start, 1e-3)
+    compressed_size = os.path.getsize(tarball_path)
+    print(f"unpack {base}: {compressed_size / 1e6:.1f} MB -> {size / 1e6:.1f} MB"
+          f" in {duration:.2f}s ({compressed_size / 1e6 / duration:.1f} MB/s compressed,"
+          f" {size / 1e6 / duration:.1f} MB/s uncompressed)")
     return path
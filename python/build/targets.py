@@ -0,0 +1,51 @@
+import hashlib
+import json
+from typing import Any, Optional
+
+from .fsutil import write_if_changed
+from .toolchain import AnyToolchain, MingwToolchain, get_android_toolchain
+
+# A target spec is a JSON-serializable description of a toolchain; it
+# allows child processes (see build/step.py) to create the same
+# toolchain as the build script.
+
+Spec = dict[str, Any]
+
+def mingw(top_path: str, toolchain_path: str, host_triplet: str, x64: bool,
+          tarball_path: str, src_path: str, build_path: str, install_prefix: str,
+          profile: Optional[str]=None) -> Spec:
+    return {'kind': 'mingw',
+            'args': [top_path, toolchain_path, host_triplet, x64,
+                     tarball_path, src_path, build_path, install_prefix, profile]}
+
+def android(top_path: str, lib_path: str, tarball_path: str, src_path: str,
+            ndk_path: str, android_abi: str, use_cxx: bool,
+            profile: Optional[str]=None) -> Spec:
+    return {'kind': 'android',
+            'args': [top_path, lib_path, tarball_path, src_path,
+                     ndk_path, android_abi, use_cxx, profile]}
+
+def get_id(spec: Spec) -> str:
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+def create(spec: Spec) -> AnyToolchain:
+    kind = spec['kind']
+    if kind == 'mingw':
+        return MingwToolchain(*spec['args'])
+    elif kind == 'android':
+        return get_android_toolchain(*spec['args'])
+    else:
+        raise RuntimeError('Unknown target kind: ' + kind)
+
+def load(path: str, target_id: str) -> AnyToolchain:
+    """Create the toolchain of a target from a file written by
+    save()."""
+
+    with open(path) as f:
+        return create(json.load(f)[target_id])
+
+def save(path: str, specs: list[Spec]) -> None:
+    """Write a file describing the given targets (by their id)."""
+
+    write_if_changed(path, json.dumps({get_id(spec): spec for spec in specs},
+                                  sort_keys=True, indent=1))
@@ -1,14 +1,13 @@
+import functools
 import os.path
 import platform
-import shutil
-from typing import Union
+from typing import Optional, Union
+
+from . import ccache, pkgconfig, profiles
+from .fsutil import write_if_changed
 
 def with_ccache(command: str) -> str:
-    ccache = shutil.which('ccache')
-    if ccache is None:
-        return command
-    else:
-        return f'{ccache} {command}'
+    return ccache.with_launcher(command)
 
 android_abis = {
     'armeabi-v7a': {
@@ -36,6 +35,34 @@ android_abis = {
     },
 }
 
+def install_pkg_config(install_prefix: str, env: dict[str, str]) -> str:
+    """Redirect pkg-config to our root directory instead of the default
+    one on the build host, and return the path of the pkg-config
+    program to be used.
+
+    configure scripts and meson call it hundreds of times, so the real
+    pkg-config is used directly if there is one, and PKG_CONFIG_LIBDIR
+    is set in the given environment.  Otherwise (or with
+    MPD_PKG_CONFIG=builtin), a wrapper script running
+    build/pkgconfig.py is installed; it needs no other program, but is
+    slower because of the Python startup.  The file is only written if
+    its contents have changed, so its time stamp remains stable."""
+
+    env['PKG_CONFIG_LIBDIR'] = os.pathsep.join(pkgconfig.get_libdir(install_prefix))
+
+    program = pkgconfig.find_real()
+    if program is not None and os.environ.get('MPD_PKG_CONFIG') != 'builtin':
+        return program
+
+    data = pkgconfig.get_wrapper(install_prefix)
+
+    bin_dir = os.path.join(install_prefix, 'bin')
+    os.makedirs(bin_dir, exist_ok=True)
+    path = os.path.join(bin_dir, 'pkg-config')
+    if write_if_changed(path, data):
+        os.chmod(path, 0o755)
+    return path
+
 # https://developer.android.com/ndk/guides/other_build_systems
 def build_arch() :
     platforms = {
@@ -51,7 +78,7 @@ class AndroidNdkToolchain:
     def __init__(self, top_path: str, lib_path: str,
                  tarball_path: str, src_path: str,
                  ndk_path: str, android_abi: str,
-                 use_cxx):
+                 use_cxx, profile: Optional[str]=None):
         # select the NDK target
         abi_info = android_abis[android_abi]
         host_triplet = abi_info['arch']
@@ -60,12 +87,13 @@ class AndroidNdkToolchain:
 
         self.tarball_path = tarball_path
         self.src_path = src_path
-        self.build_path = os.path.join(arch_path, 'build')
+        self.build_path = os.path.join(arch_path, profiles.get_dir_name('build', profile))
+        self.profile = profile
 
         ndk_arch = abi_info['ndk_arch']
         android_api_level = '24'
 
-        install_prefix = os.path.join(arch_path, 'root')
+        install_prefix = os.path.join(arch_path, profiles.get_dir_name('root', profile))
 
         self.host_triplet = host_triplet
         self.install_prefix = install_prefix
@@ -73,12 +101,21 @@ class AndroidNdkToolchain:
         llvm_path = os.path.join(ndk_path, 'toolchains', 'llvm', 'prebuilt', build_arch())
         llvm_triple = host_triplet + android_api_level
 
-        common_flags = '-Os -g'
+        build_profile = profiles.get(profile)
+        if build_profile is not None:
+            # the linker gets these flags, too (see ldflags below)
+            common_flags = build_profile.get_cflags(host_triplet, clang=True)
+        else:
+            common_flags = '-Os -g'
         common_flags += ' ' + abi_info['cflags']
 
         llvm_bin = os.path.join(llvm_path, 'bin')
-        self.cc = with_ccache(os.path.join(llvm_bin, 'clang'))
-        self.cxx = with_ccache(os.path.join(llvm_bin, 'clang++'))
+        # the compilers without the compiler cache launcher (for
+        # Project.fingerprint())
+        self.real_cc = os.path.join(llvm_bin, 'clang')
+        self.real_cxx = os.path.join(llvm_bin, 'clang++')
+        self.cc = with_ccache(self.real_cc)
+        self.cxx = with_ccache(self.real_cxx)
         common_flags += ' -target ' + llvm_triple
 
         common_flags += ' -fvisibility=hidden -fdata-sections -ffunction-sections'
@@ -122,28 +159,43 @@ class AndroidNdkToolchain:
             self.libs += ' ' + libstdcxx_libs
 
         self.env = dict(os.environ)
+        ccache.apply(self.env, os.path.commonpath([self.src_path, self.build_path,
+                                                   self.install_prefix]))
 
-        # redirect pkg-config to use our root directory instead of the
-        # default one on the build host
-        bin_dir = os.path.join(install_prefix, 'bin')
-        os.makedirs(bin_dir, exist_ok=True)
-        self.pkg_config = shutil.copy(os.path.join(top_path, 'build', 'pkg-config.sh'),
-                                      os.path.join(bin_dir, 'pkg-config'))
+        self.pkg_config = install_pkg_config(install_prefix, self.env)
         self.env['PKG_CONFIG'] = self.pkg_config
 
+@functools.cache
+def get_android_toolchain(top_path: str, lib_path: str,
+                          tarball_path: str, src_path: str,
+                          ndk_path: str, android_abi: str,
+                          use_cxx: bool,
+                          profile: Optional[str]=None) -> AndroidNdkToolchain:
+    """Return an AndroidNdkToolchain for the given parameters; all
+    projects built for the same ABI share one instance."""
+
+    return AndroidNdkToolchain(top_path, lib_path, tarball_path, src_path,
+                               ndk_path, android_abi, use_cxx, profile)
+
 class MingwToolchain:
     def __init__(self, top_path: str,
                  toolchain_path, host_triplet, x64: bool,
-                 tarball_path, src_path, build_path, install_prefix):
+                 tarball_path, src_path, build_path, install_prefix,
+                 profile: Optional[str]=None):
         self.host_triplet = host_triplet
+        self.profile = profile
         self.tarball_path = tarball_path
         self.src_path = src_path
         self.build_path = build_path
         self.install_prefix = install_prefix
 
         toolchain_bin = os.path.join(toolchain_path, 'bin')
-        self.cc = with_ccache(os.path.join(toolchain_bin, host_triplet + '-gcc'))
-        self.cxx = with_ccache(os.path.join(toolchain_bin, host_triplet + '-g++'))
+        # the compilers without the compiler cache launcher (for
+        # Project.fingerprint())
+        self.real_cc = os.path.join(toolchain_bin, host_triplet + '-gcc')
+        self.real_cxx = os.path.join(toolchain_bin, host_triplet + '-g++')
+        self.cc = with_ccache(self.real_cc)
+        self.cxx = with_ccache(self.real_cxx)
         self.ar = os.path.join(toolchain_bin, host_triplet + '-ar')
         self.arflags = 'rcs'
         self.ranlib = os.path.join(toolchain_bin, host_triplet + '-ranlib')
@@ -151,7 +203,16 @@ class MingwToolchain:
         self.strip = os.path.join(toolchain_bin, host_triplet + '-strip')
         self.windres = os.path.join(toolchain_bin, host_triplet + '-windres')
 
-        common_flags = '-O2 -g'
+        build_profile = profiles.get(profile)
+        if build_profile is not None:
+            common_flags = build_profile.get_cflags(host_triplet, clang=False)
+            if build_profile.lto:
+                # these wrappers load the LTO plugin
+                self.ar = os.path.join(toolchain_bin, host_triplet + '-gcc-ar')
+                self.ranlib = os.path.join(toolchain_bin, host_triplet + '-gcc-ranlib')
+                self.nm = os.path.join(toolchain_bin, host_triplet + '-gcc-nm')
+        else:
+            common_flags = '-O2 -g'
 
         if not x64:
             # enable SSE support which is required for LAME
@@ -163,6 +224,8 @@ class MingwToolchain:
                         ' -DWINVER=0x0600 -D_WIN32_WINNT=0x0600'
         self.ldflags = '-L' + os.path.join(install_prefix, 'lib') + \
                        ' -static-libstdc++ -static-libgcc'
+        if build_profile is not None and build_profile.get_ldflags(host_triplet, clang=False):
+            self.ldflags += ' ' + build_profile.get_ldflags(host_triplet, clang=False)
         self.libs = ''
 
         # Explicitly disable _FORTIFY_SOURCE because it is broken with
@@ -178,14 +241,10 @@ class MingwToolchain:
         self.is_darwin = False
 
         self.env = dict(os.environ)
+        ccache.apply(self.env, os.path.commonpath([self.src_path, self.build_path,
+                                                   self.install_prefix]))
 
-        # redirect pkg-config to use our root directory instead of the
-        # default one on the build host
-        import shutil
-        bin_dir = os.path.join(install_prefix, 'bin')
-        os.makedirs(bin_dir, exist_ok=True)
-        self.pkg_config = shutil.copy(os.path.join(top_path, 'build', 'pkg-config.sh'),
-                                      os.path.join(bin_dir, 'pkg-config'))
+        self.pkg_config = install_pkg_config(install_prefix, self.env)
         self.env['PKG_CONFIG'] = self.pkg_config
 
 AnyToolchain = Union[AndroidNdkToolchain, MingwToolchain]
@@ -0,0 +1,174 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from .fsutil import write_atomic
+
+__lock = threading.Lock()
+__events: list[dict[str, Any]] = []
+__local = threading.local()
+__start = time.monotonic()
+
+def __charge(cpu: float, maxrss: int) -> None:
+    """Add the resource usage of a child process to all spans of the
+    calling thread which are currently open."""
+
+    for usage in getattr(__local, 'usage', []):
+        usage[0] += cpu
+        usage[1] = max(usage[1], maxrss)
+
+def check_call(args: Any, **kwargs: Any) -> None:
+    """Like subprocess.check_call(), but charge the CPU time and the
+    peak RSS of the child process to the span which started it."""
+
+    if not hasattr(os, 'wait4'):
+        subprocess.check_call(args, **kwargs)
+        return
+
+    with subprocess.Popen(args, **kwargs) as p:
+        try:
+            _, status, ru = os.wait4(p.pid, 0)
+        except BaseException:
+            p.kill()
+            p.wait()
+            raise
+        p.returncode = os.waitstatus_to_exitcode(status)
+
+    maxrss = ru.ru_maxrss
+    if sys.platform == 'darwin':
+        # macOS reports bytes, Linux kilobytes
+        maxrss //= 1024
+    __charge(ru.ru_utime + ru.ru_stime, maxrss)
+
+    if p.returncode != 0:
+        raise subprocess.CalledProcessError(p.returncode, args)
+
+@contextmanager
+def span(name: str, project: Optional[str]=None) -> Iterator[None]:
+    """Record the duration and resource usage of a build phase.
+
+    If "project" is given, this span describes a whole project build,
+    and it becomes the project of all spans nested inside it.
+    Otherwise, the span is attributed to the innermost enclosing
+    project of the calling thread.
+
+    Child CPU time and peak RSS are only recorded for child
+    processes started with check_call().
+    """
+
+    old_project = getattr(__local, 'project', None)
+    if project is None:
+        project = old_project
+    __local.project = project
+
+    if not hasattr(__local, 'usage'):
+        __local.usage = []
+    usage = [0.0, 0]
+    __local.usage.append(usage)
+
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        end = time.monotonic()
+        __local.usage.pop()
+        __local.project = old_project
+
+        with __lock:
+            __events.append({
+                'project': project,
+                'phase': name,
+                'thread': threading.get_ident(),
+                'start': start - __start,
+                'wall': end - start,
+                'cpu': usage[0],
+                'peak_rss_kb': usage[1],
+            })
+
+def save_events(path: str) -> None:
+    """Write all spans recorded by this process to a file, to be merged
+    into the reports of another process with load_events()."""
+
+    with __lock:
+        events = [{**e, 'start': e['start'] + __start,
+                   'thread': f"{os.getpid()}-{e['thread']}"}
+                  for e in __events]
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_atomic(path, json.dumps(events))
+
+def load_events(path: str) -> None:
+    """Add the spans saved by another process (see save_events())."""
+
+    with open(path) as f:
+        events = json.load(f)
+
+    # both processes use the system-wide monotonic clock
+    for e in events:
+        e['start'] -= __start
+    with __lock:
+        __events.extend(events)
+
+def get_report() -> dict[str, Any]:
+    """Summarize all recorded spans per project and phase."""
+
+    projects: dict[str, dict[str, Any]] = {}
+    with __lock:
+        events = list(__events)
+
+    for e in events:
+        project = projects.setdefault(e['project'] or '', {'phases': {}})
+        phase = project['phases'].setdefault(e['phase'], {
+            'wall': 0.0, 'cpu': 0.0, 'peak_rss_kb': 0,
+        })
+        phase['wall'] += e['wall']
+        phase['cpu'] += e['cpu']
+        phase['peak_rss_kb'] = max(phase['peak_rss_kb'], e['peak_rss_kb'])
+
+    return {'projects': projects, 'events': events}
+
+def get_chrome_trace() -> dict[str, Any]:
+    """Convert all recorded spans to the Chrome trace event format
+    (see chrome://tracing or https://ui.perfetto.dev/)."""
+
+    with __lock:
+        events = list(__events)
+
+    threads: dict[int, int] = {}
+    trace_events = []
+    for e in events:
+        trace_events.append({
+            'name': e['phase'],
+            'cat': e['project'] or '',
+            'ph': 'X',
+            'pid': 0,
+            'tid': threads.setdefault(e['thread'], len(threads)),
+            'ts': round(e['start'] * 1e6),
+            'dur': round(e['wall'] * 1e6),
+            'args': {
+                'project': e['project'],
+                'cpu': e['cpu'],
+                'peak_rss_kb': e['peak_rss_kb'],
+            },
+        })
+
+    return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+def write_reports(parent_path: str) -> None:
+    """Write build-report.json and build-trace.json (Chrome trace
+    format) into the given directory."""
+
+    os.makedirs(parent_path, exist_ok=True)
+    report_path = os.path.join(parent_path, 'build-report.json')
+    with open(report_path, 'w') as f:
+        json.dump(get_report(), f, indent=1)
+    trace_path = os.path.join(parent_path, 'build-trace.json')
+    with open(trace_path, 'w') as f:
+        json.dump(get_chrome_trace(), f)
+    print("build report:", report_path)
+    print("build trace:", trace_path)
@@ -0,0 +1,82 @@
+import hashlib
+import os
+from typing import Iterable, Sequence
+
+from build.project import Project
+from .fsutil import write_atomic
+from .toolchain import AnyToolchain
+
+# a file inside the install prefix describing the state of all
+# projects after the last successful build
+STAMP_FILE = '.mpd-uptodate'
+
+Node = tuple[Project, AnyToolchain]
+
+def __stat(path: str) -> str:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return 'missing'
+    return f'{st.st_ino}:{st.st_size}:{st.st_mtime_ns}'
+
+def __walk_patches(path: str) -> Iterable[str]:
+    for dirpath, dirnames, filenames in sorted(os.walk(path)):
+        for name in sorted(filenames):
+            full = os.path.join(dirpath, name)
+            yield f'{full}={__stat(full)}'
+
+def __get_inputs(nodes: Iterable[Node]) -> list[str]:
+    """Describe the given projects with information which is cheap to
+    obtain: the fingerprint inputs which do not need to read files,
+    and the stat() results of the patches, the manifest and the
+    installed file.  Everything else is covered by the manifest,
+    which is rewritten whenever a project is built."""
+
+    inputs: list[str] = []
+    for project, toolchain in sorted(nodes, key=lambda node: node[0].name):
+        inputs.append(project.name)
+        inputs += project.get_fingerprint_inputs(toolchain)
+        if project.patches is not None:
+            inputs += __walk_patches(project.patches)
+        inputs.append(__stat(project.get_manifest_path(toolchain)))
+        inputs.append(__stat(os.path.join(toolchain.install_prefix, project.installed)))
+    return inputs
+
+def __get_digest(nodes: Iterable[Node]) -> str:
+    h = hashlib.sha256()
+    for x in __get_inputs(nodes):
+        h.update(x.encode() + b'\0')
+    return h.hexdigest()
+
+def __group(nodes: Sequence[Node]) -> dict[str, list[Node]]:
+    prefixes: dict[str, list[Node]] = {}
+    for node in nodes:
+        prefixes.setdefault(node[1].install_prefix, []).append(node)
+    return prefixes
+
+def is_up_to_date(nodes: Sequence[Node]) -> bool:
+    """Check whether all of the given projects are installed and have
+    not changed since mark_up_to_date() was called.  This is much
+    faster than Project.is_installed() (no downloads, no digests), so
+    the build scripts can skip the whole dependency stage.  With
+    MPD_UPTODATE=0, this always returns False."""
+
+    if os.environ.get('MPD_UPTODATE', '1') == '0':
+        return False
+
+    for prefix, prefix_nodes in __group(nodes).items():
+        try:
+            with open(os.path.join(prefix, STAMP_FILE)) as f:
+                if f.read() != __get_digest(prefix_nodes):
+                    return False
+        except FileNotFoundError:
+            return False
+    return True
+
+def mark_up_to_date(nodes: Sequence[Node]) -> None:
+    """Record the state of all projects after they have been built
+    successfully."""
+
+    for prefix, prefix_nodes in __group(nodes).items():
+        os.makedirs(prefix, exist_ok=True)
+        write_atomic(os.path.join(prefix, STAMP_FILE), __get_digest(prefix_nodes))
@@ -1,5 +1,14 @@
 import hashlib
-from typing import cast, Any, BinaryIO
+import json
+import os
+from typing import cast, Any, BinaryIO, Optional
+
+from .fsutil import write_atomic
+from .lock import file_lock
+
+# the name of the digest cache file, which is stored in the same
+# directory as the files it describes
+DIGEST_CACHE = '.digest-cache.json'
 
 def feed_file(h: Any, f: BinaryIO) -> None:
     """Feed data read from an open file into the hashlib instance."""
@@ -37,9 +46,60 @@ def guess_digest_algorithm(digest: str) -> Any:
     else:
         return None
 
-def verify_file_digest(path: str, expected_digest: str) -> bool:
-    """Verify the digest of a file, and return True if the digest matches with the given expected digest."""
+def __stat_key(st: os.stat_result) -> list[int]:
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+def __load_digest_cache(cache_path: str) -> dict[str, Any]:
+    try:
+        with open(cache_path) as f:
+            return cast(dict[str, Any], json.load(f))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def get_cached_digest(path: str, algorithm_name: str) -> Optional[str]:
+    """Look up the digest of a file in the digest cache.  Returns None
+    if there is no entry or if the file has been modified since the
+    digest was calculated."""
+
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    cache = __load_digest_cache(os.path.join(os.path.dirname(path), DIGEST_CACHE))
+    entry = cache.get(os.path.basename(path))
+    if entry is None or entry['stat'] != __stat_key(st):
+        return None
+    return cast(Optional[str], entry['digests'].get(algorithm_name))
+
+def record_file_digest(path: str, algorithm_name: str, digest: str) -> None:
+    """Store the digest of a file in the digest cache."""
+
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    cache_path = os.path.join(os.path.dirname(path), DIGEST_CACHE)
+    with file_lock(cache_path + '.lock'):
+        cache = __load_digest_cache(cache_path)
+        name = os.path.basename(path)
+        entry = cache.get(name)
+        if entry is None or entry['stat'] != __stat_key(st):
+            entry = cache[name] = {'stat': __stat_key(st), 'digests': {}}
+        entry['digests'][algorithm_name] = digest
+        write_atomic(cache_path, json.dumps(cache, indent=1, sort_keys=True))
+
+def verify_file_digest(path: str, expected_digest: str, force: bool=False) -> bool:
+    """Verify the digest of a file, and return True if the digest matches with the given expected digest.
+
+    Digests are cached; the file is only read again if its size,
+    modification time or inode number has changed, or if "force" is
+    True or the environment variable MPD_FORCE_VERIFY is set."""
 
     algorithm = guess_digest_algorithm(expected_digest)
     assert(algorithm is not None)
-    return file_digest(algorithm, path) == expected_digest
+    algorithm_name = algorithm().name
+
+    if not force and 'MPD_FORCE_VERIFY' not in os.environ:
+        digest = get_cached_digest(path, algorithm_name)
+        if digest is not None:
+            return digest == expected_digest
+
+    digest = file_digest(algorithm, path)
+    record_file_digest(path, algorithm_name, digest)
+    return digest == expected_digest
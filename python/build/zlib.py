@@ -1,7 +1,7 @@
-import subprocess
 from typing import Optional, Sequence, Union
 
 from build.makeproject import MakeProject
+from build import trace
 from .toolchain import AnyToolchain
 
 class ZlibProject(MakeProject):
@@ -26,9 +26,14 @@ class ZlibProject(MakeProject):
             self.install_target
         ]
 
-    def _build(self, toolchain: AnyToolchain) -> None:
+    def prepare(self, toolchain: AnyToolchain) -> None:
+        # built inside a private copy of the sources
+        self.download(toolchain)
+
+    def configure(self, toolchain: AnyToolchain) -> str:
         src = self.unpack(toolchain, out_of_tree=False)
 
-        subprocess.check_call(['./configure', '--prefix=' + toolchain.install_prefix, '--static'],
-                              cwd=src, env=toolchain.env)
-        self.build_make(toolchain, src)
+        with trace.span('configure'):
+            trace.check_call(['./configure', '--prefix=' + toolchain.install_prefix, '--static'],
+                             cwd=src, env=toolchain.env)
+        return src
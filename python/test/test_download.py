@@ -0,0 +1,122 @@
+import hashlib
+import http.server
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from build.download import download_and_verify
+
+DATA = bytes(range(256)) * 1024
+DIGEST = hashlib.sha256(DATA).hexdigest()
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Serve DATA at every path; the first path component selects the
+    behavior of this mirror:
+
+    - "ok": honor Range requests
+    - "shifted": reply to Range requests with a different range
+    - "unavailable": reply 503 after a delay
+    """
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        mode = self.path.split('/')[1]
+        if mode == 'unavailable':
+            time.sleep(0.2)
+            self.send_error(503)
+            return
+
+        m = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if m is None:
+            self.__send(200, 0)
+            return
+
+        start = int(m.group(1))
+        if start >= len(DATA):
+            self.send_error(416)
+        elif mode == 'shifted':
+            self.__send(206, start // 2)
+        else:
+            self.__send(206, start)
+
+    def __send(self, status: int, start: int) -> None:
+        self.send_response(status)
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{len(DATA) - 1}/{len(DATA)}')
+        self.send_header('Content-Length', str(len(DATA) - start))
+        self.end_headers()
+        self.wfile.write(DATA[start:])
+
+class DownloadTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'data.tar.gz')
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def url(self, mode: str) -> str:
+        return f'http://127.0.0.1:{self.server.server_port}/{mode}/data.tar.gz'
+
+    def write_partial(self, data: bytes) -> None:
+        with open(self.path + '.tmp', 'wb') as f:
+            f.write(data)
+
+    def check(self, urls: Any, digest: str=DIGEST) -> None:
+        self.assertEqual(download_and_verify(urls, digest, self.tmp.name), self.path)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test_download(self) -> None:
+        self.check(self.url('ok'))
+
+    def test_resume(self) -> None:
+        self.write_partial(DATA[:1000])
+        self.check(self.url('ok'))
+
+    def test_complete_partial(self) -> None:
+        # the server replies 416 "Range Not Satisfiable"
+        self.write_partial(DATA)
+        self.check(self.url('ok'))
+
+    def test_complete_partial_race(self) -> None:
+        # the 416 must not be hidden by the later error of another
+        # mirror
+        self.write_partial(DATA)
+        self.check([self.url('ok'), self.url('unavailable')])
+
+    def test_corrupt_complete_partial(self) -> None:
+        self.write_partial(b'x' * len(DATA))
+        with self.assertRaisesRegex(RuntimeError, 'Digest mismatch'):
+            download_and_verify(self.url('ok'), DIGEST, self.tmp.name)
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+        # the next attempt starts over
+        self.check(self.url('ok'))
+
+    def test_shifted_range(self) -> None:
+        self.write_partial(DATA[:1000])
+        self.check(self.url('shifted'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from typing import Sequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from build import jobs, jobserver
+from build.project import Project
+from build.scheduler import Scheduler
+
+class Toolchain:
+    install_prefix = '/nonexistent'
+    env: dict[str, str] = {}
+
+class FakeProject(Project):
+    """A project which records its phases instead of building."""
+
+    def __init__(self, name: str, log: list[tuple[str, str, int]],
+                 depends: Sequence[str]=(), installed: bool=False,
+                 fail: bool=False):
+        self.name = name
+        self.depends = depends
+        self.log = log
+        self.installed = installed
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def __record(self, phase: str) -> None:
+        time.sleep(0.01)
+        with self.lock:
+            self.log.append((self.name, phase, jobs.get_simultaneous_jobs()))
+
+    def is_installed(self, toolchain: object) -> bool:
+        return self.installed
+
+    def run_configure(self, toolchain: object) -> bool:
+        self.__record('configure')
+        return True
+
+    def run_compile(self, toolchain: object) -> None:
+        if self.fail:
+            raise RuntimeError('failed: ' + self.name)
+        self.__record('compile')
+
+    def run_install(self, toolchain: object) -> None:
+        self.__record('install')
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        # these tests are about the fallback without a jobserver
+        self.assertIsNone(jobserver.get())
+        self.old_build_jobs = os.environ.get('MPD_BUILD_JOBS')
+        os.environ['MPD_BUILD_JOBS'] = '8'
+        self.log: list[tuple[str, str, int]] = []
+
+    def tearDown(self) -> None:
+        if self.old_build_jobs is None:
+            del os.environ['MPD_BUILD_JOBS']
+        else:
+            os.environ['MPD_BUILD_JOBS'] = self.old_build_jobs
+
+    def run_scheduler(self, *projects: FakeProject, budget: int=8) -> None:
+        scheduler = Scheduler(budget)
+        for project in projects:
+            scheduler.add(project, Toolchain())
+        scheduler.run()
+
+    def index(self, name: str, phase: str) -> int:
+        return [(n, p) for n, p, _ in self.log].index((name, phase))
+
+    def test_dependencies(self) -> None:
+        self.run_scheduler(FakeProject('app', self.log, depends=['lib']),
+                           FakeProject('lib', self.log),
+                           FakeProject('other', self.log))
+
+        self.assertEqual(len(self.log), 9)
+        for name in ('app', 'lib', 'other'):
+            self.assertLess(self.index(name, 'configure'), self.index(name, 'compile'))
+            self.assertLess(self.index(name, 'compile'), self.index(name, 'install'))
+        self.assertLess(self.index('lib', 'install'), self.index('app', 'configure'))
+
+    def test_installed(self) -> None:
+        self.run_scheduler(FakeProject('app', self.log, depends=['lib']),
+                           FakeProject('lib', self.log, installed=True))
+        self.assertEqual([(n, p) for n, p, _ in self.log],
+                         [('app', 'configure'), ('app', 'compile'), ('app', 'install')])
+
+    def test_error(self) -> None:
+        with self.assertRaisesRegex(RuntimeError, 'failed: lib'):
+            self.run_scheduler(FakeProject('app', self.log, depends=['lib']),
+                               FakeProject('lib', self.log, fail=True))
+        self.assertNotIn('app', [n for n, _, _ in self.log])
+
+    def test_cycle(self) -> None:
+        with self.assertRaisesRegex(RuntimeError, 'Dependency cycle'):
+            self.run_scheduler(FakeProject('a', self.log, depends=['b']),
+                               FakeProject('b', self.log, depends=['a']))
+
+    def test_job_shares(self) -> None:
+        self.run_scheduler(*[FakeProject(f'p{i}', self.log) for i in range(4)],
+                           budget=8)
+
+        # no compile gets more than the budget minus the jobs reserved
+        # for configure and install, and none is starved
+        shares = [n_jobs for _, phase, n_jobs in self.log if phase == 'compile']
+        self.assertEqual(len(shares), 4)
+        for n_jobs in shares:
+            self.assertGreaterEqual(n_jobs, 1)
+            self.assertLessEqual(n_jobs, 6)
+
+if __name__ == '__main__':
+    unittest.main()
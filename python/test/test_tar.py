@@ -0,0 +1,61 @@
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from build.tar import untar
+
+class UntarTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        # make read-only directories writable again, so they can be
+        # deleted
+        for dirpath, dirnames, _ in os.walk(self.tmp.name):
+            for name in dirnames:
+                os.chmod(os.path.join(dirpath, name), 0o755)
+        self.tmp.cleanup()
+
+    def make_tarball(self, suffix: str) -> str:
+        path = os.path.join(self.tmp.name, 'foo-1.0.tar' + suffix)
+        with tarfile.open(path, 'w:' + suffix.lstrip('.')) as tar:
+            info = tarfile.TarInfo('foo-1.0/readonly')
+            info.type = tarfile.DIRTYPE
+            info.mode = 0o555
+            info.mtime = 1234567890
+            tar.addfile(info)
+
+            data = b'hello\n'
+            info = tarfile.TarInfo('foo-1.0/readonly/file.txt')
+            info.size = len(data)
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(data))
+        return path
+
+    def check(self, suffix: str) -> None:
+        parent = os.path.join(self.tmp.name, 'src')
+        path = untar(self.make_tarball(suffix), parent, 'foo-1.0')
+        self.assertEqual(path, os.path.join(parent, 'foo-1.0'))
+
+        directory = os.path.join(path, 'readonly')
+        with open(os.path.join(directory, 'file.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'hello\n')
+
+        # the directory attributes are applied after its contents
+        st = os.stat(directory)
+        self.assertEqual(st.st_mode & 0o777, 0o555)
+        self.assertEqual(st.st_mtime, 1234567890)
+
+    def test_gz(self) -> None:
+        self.check('.gz')
+
+    def test_xz(self) -> None:
+        self.check('.xz')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,15 @@
 #!/usr/bin/env -S python3 -u
 
 import os, os.path
-import sys, subprocess
+import sys
 import shutil
 
 configure_args = sys.argv[1:]
 
 x64 = True
+sources_only = False
+use_ninja = False
+profile = None
 
 while len(configure_args) > 0:
     arg = configure_args[0]
@@ -14,6 +17,15 @@ while len(configure_args) > 0:
         x64 = True
     elif arg == '--32':
         x64 = False
+    elif arg == '--sources-only':
+        # only download and unpack; see python/build-matrix.py
+        sources_only = True
+    elif arg == '--ninja':
+        # build the third-party libraries with a generated build.ninja
+        use_ninja = True
+    elif arg.startswith('--profile='):
+        # compiler settings, see python/build/profiles.py
+        profile = arg.split('=', 1)[1]
     else:
         break
     configure_args.pop(0)
@@ -29,36 +41,82 @@ sys.path[0] = os.path.join(mpd_path, 'python')
 
 # output directories
 from build.dirs import lib_path, tarball_path, src_path
-from build.toolchain import MingwToolchain
 
 arch_path = os.path.join(lib_path, host_arch)
-build_path = os.path.join(arch_path, 'build')
-root_path = os.path.join(arch_path, 'root')
+from build.profiles import get_dir_name
+build_path = os.path.join(arch_path, get_dir_name('build', profile))
+root_path = os.path.join(arch_path, get_dir_name('root', profile))
 
 # a list of third-party libraries to be used by MPD on Android
-from build.libs import *
-thirdparty_libs = [
-    zlib,
-    libmodplug,
-    libopenmpt,
-    wildmidi,
-    gme,
-    ffmpeg,
-    libnfs,
-    libsamplerate,
-]
+from build import libs
+thirdparty_names = (
+    'zlib',
+    'libmodplug',
+    'libopenmpt',
+    'wildmidi',
+    'gme',
+    'ffmpeg',
+    'libnfs',
+    'libsamplerate',
+)
+thirdparty_libs = [libs.get(name) for name in thirdparty_names]
 
 # build the third-party libraries
-toolchain = MingwToolchain(mpd_path,
-                           '/usr', host_arch, x64,
-                           tarball_path, src_path, build_path, root_path)
+from build import targets
+target = targets.mingw(mpd_path, '/usr', host_arch, x64,
+                       tarball_path, src_path, build_path, root_path, profile)
+toolchain = targets.create(target)
 
-for x in thirdparty_libs:
-    if not x.is_installed(toolchain):
-        x.build(toolchain)
+# if nothing has changed since the last build, skip the whole
+# dependency stage (this only needs stat() calls)
+from build import uptodate
+nodes = [(x, toolchain) for x in thirdparty_libs]
+up_to_date = not sources_only and uptodate.is_up_to_date(nodes)
+
+# download all tarballs in parallel before starting the build
+from build.download import download_all
+from build import trace
+
+# write the build reports even if the build fails; a failed or slow
+# build is when they are needed most
+import atexit
+atexit.register(trace.write_reports, lib_path)
+if not up_to_date and not use_ninja:
+    with trace.span('download'):
+        download_all([(x.url, x.md5) for x in thirdparty_libs], tarball_path)
+
+if sources_only:
+    for x in thirdparty_libs:
+        x.prepare(toolchain)
+    sys.exit(0)
+
+# all make and ninja processes share one jobserver
+from build import jobserver
+from build.jobs import get_default_jobs
+js = jobserver.start(get_default_jobs())
+if js is not None:
+    js.apply(toolchain.env)
+
+if not up_to_date:
+    if use_ninja:
+        from build import ninjafile
+        ninjafile.run(os.path.join(arch_path, 'ninja'),
+                      [(name, target) for name in thirdparty_names])
+    else:
+        from build.scheduler import Scheduler
+        scheduler = Scheduler()
+        for x in thirdparty_libs:
+            scheduler.add(x, toolchain)
+        scheduler.run()
+    uptodate.mark_up_to_date(nodes)
 
 # configure and build MPD
 
 from build.meson import configure as run_meson
-run_meson(toolchain, mpd_path, '.', configure_args)
-subprocess.check_call(['/usr/bin/ninja'], env=toolchain.env)
+from build import ccache
+with trace.span('build', project='mpd'):
+    run_meson(toolchain, mpd_path, '.', configure_args)
+    with trace.span('compile'):
+        trace.check_call(['/usr/bin/ninja'], env=toolchain.env)
+
+ccache.print_summary()